@@ -0,0 +1,105 @@
+import csv
+import os
+import random
+import sys
+import time
+from src.classifier import TEXT_MARKERS, classify, text_markers
+from src.document import Document
+import globals
+
+DOCUMENTS_CSV = 'data/documents_analysis.csv'
+FILLER = ['forest', 'carbon', 'validation', 'report', 'monitoring', 'VCS', 'Version', 'project', 'description', 'CCB',
+          '&', 'joint', 'verification', 'deed', 'of', 'representation', 'listing', 'REPORT:', 'agreement']
+EXTRA_FILENAMES = ['PRR_1234.pdf', 'area.kml', 'AREA.KML', 'Joint VAL VER report.pdf', 'project_review_report.pdf',
+                   'MR 2019-2020.pdf', 'PD v2.PDF', 'registration representation.pdf', 'communications agreement.docx',
+                   'Joint Monitoring Project Description.pdf', 'photo.jpg']
+
+
+def load_filenames():
+    filenames = list(EXTRA_FILENAMES)
+    if os.path.exists(DOCUMENTS_CSV):
+        with open(DOCUMENTS_CSV, mode='r', encoding='utf-8') as file:
+            filenames += [row['filename'] for row in csv.DictReader(file)]
+    return filenames
+
+
+def generate_text(rng, length):
+    # filler made of the marker words, with a few markers in upper, lower or original case, some of them overlapping
+    words = [rng.choice(FILLER) for _ in range(length // 7)]
+    for _ in range(rng.randint(0, 3)):
+        marker, _ = rng.choice(list(TEXT_MARKERS.values()))
+        marker = rng.choice([marker, marker.upper(), marker.lower(), 'JOINT ' + marker.upper()])
+        words.insert(rng.randrange(len(words) + 1), marker)
+    if rng.random() < 0.2:
+        # lowercases to two characters, see classifier.text_markers
+        words.insert(rng.randrange(len(words) + 1), 'İ')
+    return ' '.join(words)
+
+
+def reference_type(filename, text, doc_type):
+    document = Document(1, 1, filename, None, None, None, text=text, doc_type=doc_type)
+    document.apply_classification_rules()
+    return document.doc_type
+
+
+def run(cases=20000, seed=7):
+    rng = random.Random(seed)
+    filenames = load_filenames()
+    mismatches = 0
+    for _ in range(cases):
+        filename = rng.choice(filenames)
+        text = generate_text(rng, rng.choice([0, 200, 5000]))
+        doc_type = rng.choice([0, 0, 0, globals.OTHER])
+        expected = reference_type(filename, text, doc_type)
+        actual = classify(filename, text, doc_type)
+        if expected != actual:
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"mismatch for {filename!r}: rules {expected}, classifier {actual}")
+    print(f"{cases} generated cases from {len(filenames)} filenames, {mismatches} mismatch(es)")
+    assert mismatches == 0, f"classifier.classify differs from the rules in {mismatches} generated case(s)"
+
+    # every stored filename, with and without title markers in the text
+    for filename in filenames:
+        for text in ('', generate_text(rng, 200)):
+            expected = reference_type(filename, text, 0)
+            assert classify(filename, text) == expected, f"classifier.classify differs from the rules for {filename!r}"
+
+    # the production window: markers past CLASSIFIER_HEADER_CHARS are not seen, which may change the classification
+    window = globals.CLASSIFIER_HEADER_CHARS
+    window_cases = cases // 20
+    beyond = changed = unexplained = 0
+    for _ in range(window_cases):
+        filename = rng.choice(filenames)
+        text = generate_text(rng, rng.choice([window // 2, window * 2, window * 4]))
+        doc_type = rng.choice([0, 0, 0, globals.OTHER])
+        markers_beyond = text_markers(text) != text_markers(text, window)
+        beyond += markers_beyond
+        if reference_type(filename, text, doc_type) != classify(filename, text, doc_type, window):
+            changed += 1
+            # a change without markers past the window would be a bug of the windowed scan
+            unexplained += not markers_beyond
+    print(f"{window_cases} generated cases with a {window} character window: {beyond} with markers past the window, "
+          f"{changed} classification(s) changed, {unexplained} of them not explained by markers past the window")
+    assert unexplained == 0, f"{unexplained} classification(s) changed without markers past the window"
+
+    # timing on project description sized texts, markers in the header as in the registry documents
+    texts = [generate_text(rng, 2000000) for _ in range(3)]
+    start_time = time.perf_counter()
+    expected = [reference_type('document.pdf', text, 0) for text in texts]
+    rules_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    actual = [classify('document.pdf', text, 0) for text in texts]
+    full_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    [classify('document.pdf', text, 0, globals.CLASSIFIER_HEADER_CHARS) for text in texts]
+    window_seconds = time.perf_counter() - start_time
+    print(f"2 MB texts: rules {rules_seconds / 3 * 1000:.1f}ms, single scan of the whole text "
+          f"{full_seconds / 3 * 1000:.1f}ms, single scan of the first {globals.CLASSIFIER_HEADER_CHARS} characters "
+          f"{window_seconds / 3 * 1000:.2f}ms per document, {sum(e != a for e, a in zip(expected, actual))} "
+          f"mismatch(es)")
+    assert expected == actual, "classifier.classify differs from the rules on the 2 MB texts"
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,74 @@
+import os
+import random
+import sys
+import tempfile
+import time
+from langdetect import detect
+import src.language as language_detection
+
+WORDS = {
+    'en': ['forest', 'carbon', 'emission', 'reduction', 'community', 'the', 'project', 'activity', 'of', 'and',
+           'baseline', 'monitoring', 'is', 'with', 'area', 'will', 'be', 'land', 'which', 'during'],
+    'es': ['bosque', 'carbono', 'emisiones', 'reducción', 'comunidad', 'el', 'proyecto', 'actividad', 'de', 'y',
+           'línea', 'monitoreo', 'es', 'con', 'área', 'será', 'tierra', 'que', 'durante', 'las'],
+    'pt': ['floresta', 'carbono', 'emissões', 'redução', 'comunidade', 'o', 'projeto', 'atividade', 'de', 'e',
+           'linha', 'monitoramento', 'é', 'com', 'área', 'será', 'terra', 'que', 'durante', 'não'],
+    'fr': ['forêt', 'carbone', 'émissions', 'réduction', 'communauté', 'le', 'projet', 'activité', 'de', 'et',
+           'référence', 'surveillance', 'est', 'avec', 'zone', 'sera', 'terres', 'qui', 'pendant', 'les'],
+}
+
+
+def generate_document(rng, language, characters):
+    # mostly one language, with English cover pages and numeric tables in between like the registry documents
+    parts = [' '.join(rng.choice(WORDS['en']) for _ in range(150))]
+    length = len(parts[0])
+    while length < characters:
+        if rng.random() < 0.2:
+            part = ' '.join(f'{rng.uniform(0, 1e5):.2f}' for _ in range(80))
+        else:
+            part = ' '.join(rng.choice(WORDS[language]) for _ in range(200)) + '.'
+        parts.append(part)
+        length += len(part) + 1
+    return '\n'.join(parts)
+
+
+def detect_full(text):
+    # the unseeded whole text detection Document.analyse_language used before src.language
+    return detect(text)
+
+
+def run(documents=40, characters=500000):
+    rng = random.Random(7)
+    corpus = [(language, generate_document(rng, language, characters))
+              for language in (rng.choice(list(WORDS)) for _ in range(documents))]
+    print(f"{documents} generated documents of about {characters} characters")
+
+    start_time = time.perf_counter()
+    full = [detect_full(text) for _, text in corpus]
+    full_seconds = time.perf_counter() - start_time
+    # unseeded langdetect differs between runs on ambiguous texts, a second pass counts the flips
+    flips = sum(detect_full(text) != result for (_, text), result in zip(corpus, full))
+
+    with tempfile.TemporaryDirectory() as directory:
+        language_detection.LANGUAGE_CACHE_DB = os.path.join(directory, 'language_cache.db')
+        start_time = time.perf_counter()
+        sampled = [language_detection.detect_language(text) for _, text in corpus]
+        sampled_seconds = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        cached = [language_detection.detect_language(text) for _, text in corpus]
+        cached_seconds = time.perf_counter() - start_time
+        language_detection.LANGUAGE_CACHE_DB = os.path.join(directory, 'second_run.db')
+        repeated = [language_detection.detect_language(text) for _, text in corpus]
+
+    correct_full = sum(result == language for (language, _), result in zip(corpus, full))
+    correct_sampled = sum(result == language for (language, _), (result, _) in zip(corpus, sampled))
+    agreement = sum(a == b for a, (b, _) in zip(full, sampled))
+    print(f"full text: {full_seconds:.2f}s, {correct_full}/{documents} correct, {flips} result(s) changed on rerun")
+    print(f"sampled:   {sampled_seconds:.2f}s, {correct_sampled}/{documents} correct, agrees with full text on "
+          f"{agreement}/{documents}, lowest confidence {min(confidence for _, confidence in sampled):.3f}")
+    print(f"cached:    {cached_seconds:.3f}s, identical {cached == sampled}, "
+          f"fresh cache gives identical results {repeated == sampled}")
+
+
+if __name__ == '__main__':
+    run(*(int(argument) for argument in sys.argv[1:3]))
@@ -0,0 +1,77 @@
+import csv
+import sys
+import time
+from bs4 import BeautifulSoup
+from src.page_extractor import extract_page, etree
+
+PROJECTS_CSV = 'data/projects.csv'
+
+
+def legacy_extraction(content):
+    # the BeautifulSoup parse and the two tree walks Project used before src.page_extractor
+    soup = BeautifulSoup(content, 'html.parser')
+    rows = []
+    for group in soup.find_all('apx-document-group'):
+        section = group.find('div', {'class': 'card-header'}).text.strip()
+        for row in group.find_all('tr'):
+            cells = row.find_all('td')
+            if len(cells) > 1:
+                link = cells[0].find('a')
+                rows.append((section, link.text.strip(), link['href'], cells[1].text.strip()))
+    data = {}
+    vcs_started = False
+    ccb_started = False
+    current_key = None
+    for th in soup.find_all(['th', 'td']):
+        text = th.text.strip()
+        if th.name == 'th' and 'attr-sub-hdg' in th.get('class', []):
+            if text == 'VCS':
+                vcs_started = True
+                ccb_started = False
+            elif text == 'CCB':
+                ccb_started = True
+                vcs_started = False
+            current_key = None
+            continue
+        if vcs_started and not ccb_started and th.name == 'th':
+            current_key = text
+            data[current_key] = []
+        elif current_key and th.name == 'td':
+            data[current_key].append(text)
+    return rows, data
+
+
+def load_snapshots(limit):
+    csv.field_size_limit(sys.maxsize)
+    with open(PROJECTS_CSV, mode='r', encoding='utf-8') as file:
+        snapshots = [row['website_soup'] for row in csv.DictReader(file) if row.get('website_soup')]
+    return snapshots[:limit] if limit else snapshots
+
+
+def timed(extraction, snapshots):
+    start_time = time.perf_counter()
+    results = [extraction(content) for content in snapshots]
+    return time.perf_counter() - start_time, results
+
+
+def run(limit=None):
+    snapshots = load_snapshots(limit)
+    if not snapshots:
+        print(f"no stored website_soup snapshots found in {PROJECTS_CSV}")
+        return
+    size = sum(len(content) for content in snapshots) / 1024 / 1024
+    print(f"{len(snapshots)} stored project pages, {size:.1f} MB of HTML")
+
+    legacy_seconds, expected = timed(legacy_extraction, snapshots)
+    print(f"{'BeautifulSoup, two passes':<28} {legacy_seconds:8.2f}s")
+    parsers = ['tokenizer', 'lxml'] if etree else ['tokenizer']
+    for parser in parsers:
+        seconds, pages = timed(lambda content: extract_page(content, parser), snapshots)
+        mismatches = sum(1 for page, (rows, data) in zip(pages, expected)
+                         if page.document_rows != rows or page.attributes != data)
+        print(f"{'page_extractor, ' + parser:<28} {seconds:8.2f}s  {legacy_seconds / seconds:5.1f}x faster, "
+              f"{mismatches} page(s) differ from the BeautifulSoup result")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,120 @@
+import difflib
+import multiprocessing
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import time
+from src.extraction_backends import available_backends, get_backend
+
+WORDS = ['forest', 'carbon', 'emission', 'reduction', 'community', 'baseline', 'monitoring', 'deforestation',
+         'project', 'activity', 'hectares', 'methodology', 'verification', 'leakage', 'biomass', 'tCO2e']
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def build_report(path, pages, rng):
+    # prose pages with numbered headings, like the project descriptions on the registry
+    from reportlab.pdfgen import canvas
+    pdf = canvas.Canvas(path)
+    for page in range(pages):
+        pdf.setFont('Helvetica', 9)
+        pdf.drawString(72, 800, 'Project Description: VCS Version 4')
+        pdf.setFont('Helvetica-Bold', 12)
+        pdf.drawString(72, 770, f'{page // 6 + 1}.{page % 6 + 1} {sentence(rng, 4)}')
+        pdf.setFont('Helvetica', 10)
+        for line in range(45):
+            pdf.drawString(72, 745 - line * 15, sentence(rng))
+        pdf.showPage()
+    pdf.save()
+
+
+def build_tables(path, pages, rng):
+    # monitoring style tables, one row of numbers per line
+    from reportlab.pdfgen import canvas
+    pdf = canvas.Canvas(path)
+    for page in range(pages):
+        pdf.setFont('Helvetica', 9)
+        for row in range(50):
+            y = 790 - row * 15
+            pdf.drawString(60, y, f'{2010 + row % 12}')
+            for column in range(5):
+                pdf.drawRightString(180 + column * 80, y, f'{rng.uniform(0, 100000):,.2f}')
+        pdf.showPage()
+    pdf.save()
+
+
+def build_two_columns(path, pages, rng):
+    from reportlab.pdfgen import canvas
+    pdf = canvas.Canvas(path)
+    for page in range(pages):
+        pdf.setFont('Helvetica', 9)
+        for line in range(55):
+            pdf.drawString(50, 790 - line * 13, sentence(rng, 6))
+            pdf.drawString(310, 790 - line * 13, sentence(rng, 6))
+        pdf.showPage()
+    pdf.save()
+
+
+FIXTURES = {'report': build_report, 'tables': build_tables, 'two_columns': build_two_columns}
+
+
+def build_fixtures(directory, pages):
+    rng = random.Random(42)
+    paths = {}
+    for name, build in FIXTURES.items():
+        paths[name] = os.path.join(directory, name + '.pdf')
+        build(paths[name], pages, rng)
+    return paths
+
+
+def measure(backend_name, paths, results):
+    # runs in its own process, so the peak RSS belongs to this backend alone
+    backend = get_backend(backend_name)
+    texts = {}
+    pages = 0
+    start_time = time.perf_counter()
+    for name, path in paths.items():
+        page_texts = list(backend.iter_pages(path))
+        pages += len(page_texts)
+        texts[name] = ''.join(page_texts)
+    seconds = time.perf_counter() - start_time
+    # ru_maxrss is in kilobytes on Linux
+    results.put((seconds, pages, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, texts))
+
+
+def run_backend(backend_name, paths):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=measure, args=(backend_name, paths, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def fidelity(reference, text):
+    # word level similarity to the pdfminer output, layout whitespace is ignored
+    return difflib.SequenceMatcher(None, re.findall(r'\S+', reference), re.findall(r'\S+', text),
+                                   autojunk=False).ratio()
+
+
+def run(pages=40):
+    with tempfile.TemporaryDirectory() as directory:
+        paths = build_fixtures(directory, pages)
+        print(f"{len(paths)} generated fixtures ({', '.join(paths)}) of {pages} pages each")
+        print(f"{'backend':<10} {'pages/s':>9} {'peak RSS':>10}  fidelity to pdfminer per fixture")
+        reference = None
+        for backend_name in available_backends():
+            seconds, page_count, peak_rss, texts = run_backend(backend_name, paths)
+            reference = reference or texts
+            scores = ', '.join(f"{name} {fidelity(reference[name], texts[name]):.3f}" for name in paths)
+            print(f"{backend_name:<10} {page_count / seconds:9.1f} {peak_rss:8.1f}MB  {scores}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 40)
@@ -0,0 +1,61 @@
+import random
+import sys
+import time
+import tracemalloc
+import re
+from src.normaliser import default_normaliser
+
+
+def legacy_preprocess(x):
+    # the four passes Document.preprocess_text used before src.normaliser
+    x1 = re.sub(r'\n+', '\n', x)
+    x2 = re.sub(r'\S+@\S+', '[personal e-mail]', x1)
+    x3 = re.sub(r'\d{6,}', '[personal phone number]', x2)
+    x4 = re.sub(r'\.{5,}', '....', x3)
+    return x4
+
+
+def generate_pages(rng, pages, page_length=3000):
+    # pages that end in the middle of e-mail addresses, numbers, dot leaders and newline runs
+    pieces = ['forest', 'carbon', 'x@y.org', 'a.b@c', '@', '12345', '1234567', '.....', '...', '\n', '\n\n\n', ' ',
+              ' ', ' ', '\t', 'İ']
+    result = []
+    for _ in range(pages):
+        page = []
+        while sum(len(piece) for piece in page) < page_length:
+            page.append(rng.choice(pieces))
+        result.append(''.join(page) + rng.choice(['\f', '', '\n']))
+    return result
+
+
+def measured(function):
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start_time
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def run(pages=2000, seed=11):
+    rng = random.Random(seed)
+    mismatches = 0
+    for _ in range(300):
+        chunks = generate_pages(rng, rng.randint(1, 8), rng.choice([5, 50, 500]))
+        if default_normaliser.normalise_stream(chunks) != legacy_preprocess(''.join(chunks)):
+            mismatches += 1
+    print(f"300 generated chunk streams, {mismatches} differ from the four re.sub passes")
+
+    chunks = generate_pages(rng, pages)
+    size = sum(len(chunk) for chunk in chunks) / 1024 / 1024
+    expected, legacy_seconds, legacy_peak = measured(lambda: legacy_preprocess(''.join(chunks)))
+    actual, seconds, peak = measured(lambda: default_normaliser.normalise_stream(iter(chunks)))
+    print(f"{pages} pages, {size:.1f} MB of text")
+    print(f"four re.sub passes over the joined text  {legacy_seconds:6.2f}s  peak {legacy_peak / 1024 / 1024:6.1f} MB")
+    print(f"one pass over the streamed pages         {seconds:6.2f}s  peak {peak / 1024 / 1024:6.1f} MB  "
+          f"{'same' if actual == expected else 'different'} result")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
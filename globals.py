@@ -15,4 +15,32 @@ MAPPING_OF_AREA = 51
 OTHER = 61
 URL = "https://registry.verra.org/app/search/VCS/All%20Projects"
 PROJECT_URL_BASE = "https://registry.verra.org/app/projectDetail/VCS/"
+# backing endpoint of the "Download Excel" button of the project search
+PROJECT_LIST_EXPORT_URL = ("https://registry.verra.org/uiapi/resource/resource/search"
+                           "?$skip=0&count=true&$format=xlsx&$exportFileName=allprojects.xlsx")
+PROJECT_LIST_EXPORT_QUERY = {"program": "VCS"}
 TEMP_DOC_STORAGE = "currently_analysed_files"
+PROJECT_UPDATE_FLUSH_EVERY = 10
+BROWSER_POOL_SIZE = 1
+BROWSER_PAGES_PER_BROWSER = 4
+SCRAPE_CONCURRENCY = 4
+REGISTRY_MIN_REQUEST_INTERVAL = 1.0
+DOWNLOAD_CONCURRENCY = 4
+# 0 starts one text extraction process per core
+EXTRACTION_WORKERS = 0
+PIPELINE_QUEUE_SIZE = 8
+STORE_BATCH_SIZE = 16
+PIPELINE_PROJECTS = 8
+# documents up to this size are extracted from memory, larger ones are written to TEMP_DOC_STORAGE first
+DOCUMENT_SPILL_BYTES = 32 * 1024 * 1024
+# pdfminer, pypdf, pymupdf or pdfium, see src/extraction_backends.py, the PDF_BACKEND variable overrides it per run
+PDF_EXTRACTION_BACKEND = "pdfminer"
+# leading characters of a text the document classifier looks for title markers in, 0 for the whole text
+CLASSIFIER_HEADER_CHARS = 50000
+# "sampled" votes over LANGUAGE_SAMPLES windows of LANGUAGE_SAMPLE_CHARS characters spread over the text, "full" runs
+# langdetect on the whole text, both with the fixed LANGUAGE_SEED, see src/language.py
+LANGUAGE_DETECTION = "sampled"
+LANGUAGE_SAMPLES = 5
+LANGUAGE_SAMPLE_CHARS = 2000
+LANGUAGE_SEED = 0
+PROJECT_MAX_AGE_HOURS = 20
@@ -2,10 +2,18 @@ from src.scraper import *
 import src.database as database
 from src.analysis import analyse_project_activities
 from src.model_and_vectors import *
+import src.browser_pool as browser_pool
+import src.pipeline as pipeline
+from src.project import SKIPPED_FRESH, SKIPPED_UNCHANGED, UPDATED, INCOMPLETE, PLANNED
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from datetime import timedelta
 
 
 load_dotenv()
 openai_api_key: str = os.environ.get("OPENAI_API_KEY")
+# SYNC_DRY_RUN=1 only reports which documents a sync would download and which were removed from the registry
+sync_dry_run: bool = os.environ.get("SYNC_DRY_RUN") == "1"
 
 
 def script():
@@ -13,13 +21,19 @@ def script():
     logger = logging.getLogger('MyApp')
     logger.info('Starting the application')
     start_time = time.time()
+    # one-shot import of a legacy documents.csv into the indexed document store
+    database.migrate_documents_csv()
     ##############################
     # download project list and save project IDs in database
     download_and_update_project_list()
     ##############################
     # scrape documents for projects and extract project activities
-    scrape_all_projects()
+    scrape_all_projects(dry_run=sync_dry_run)
+    if sync_dry_run:
+        return
     analyse_all_projects()
+    # merge updates journaled by parallel workers back into projects.csv
+    database.compact_project_journal()
     ##############################
     # cluster project activities and classify them.
     cluster_project_activities()
@@ -64,18 +78,62 @@ def get_activity_list():
     return projects
 
 
-def scrape_all_projects():
+def scrape_all_projects(concurrency=globals.SCRAPE_CONCURRENCY, dry_run=False):
+    logger = logging.getLogger('MyApp')
     projects = database.retrieve_db_project_list()
-    for project in projects:
-        project.scrape_and_analyse_documents()
+    try:
+        with database.project_update_session(globals.PROJECT_UPDATE_FLUSH_EVERY):
+            if concurrency > 1:
+                outcomes = asyncio.get_event_loop().run_until_complete(
+                    scrape_projects_concurrently(projects, concurrency, dry_run))
+            else:
+                outcomes = [project.scrape_and_analyse_documents(dry_run=dry_run) for project in projects]
+    finally:
+        asyncio.get_event_loop().run_until_complete(browser_pool.close_pool())
+        pipeline.close_pipeline()
+    report = Counter(outcomes)
+    logger.info(f"Refreshed {len(projects)} projects: {report[SKIPPED_FRESH]} skipped as synced within the last "
+                f"{globals.PROJECT_MAX_AGE_HOURS}h, {report[SKIPPED_UNCHANGED]} skipped as their document table did "
+                f"not change, {report[UPDATED]} updated, {report[INCOMPLETE]} with failed downloads, "
+                f"{report[PLANNED]} planned without syncing, {report['failed']} failed")
+    return report
+
+
+async def scrape_projects_concurrently(projects, concurrency, dry_run=False):
+    logger = logging.getLogger('MyApp')
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    max_age = timedelta(hours=globals.PROJECT_MAX_AGE_HOURS)
+
+    # up to `concurrency` pages render at the same time, the documents of up to PIPELINE_PROJECTS rendered pages then
+    # go through the shared document pipeline together, each project waiting on a worker thread for its own documents
+    with ThreadPoolExecutor(max_workers=globals.PIPELINE_PROJECTS) as document_worker:
+        async def scrape(project):
+            if project.is_fresh(max_age):
+                return SKIPPED_FRESH
+            async with semaphore:
+                logger.info(f"Starting to scrape documents for project {project.project_id}.")
+                content = await project.get_page_content(store=not dry_run)
+            return await loop.run_in_executor(document_worker, project.analyse_page, content, dry_run)
+
+        results = await asyncio.gather(*(scrape(project) for project in projects), return_exceptions=True)
+
+    outcomes = []
+    for project, result in zip(projects, results):
+        if isinstance(result, Exception):
+            logger.info(f"Scraping project {project.project_id} failed due to the following error: {result}")
+            result = 'failed'
+        outcomes.append(result)
+    return outcomes
 
 
 def analyse_all_projects():
     projects = database.retrieve_db_project_list()
-    with open('data/project_activities.txt', 'w') as file:
+    with open('data/project_activities.txt', 'w') as file, \
+            database.project_update_session(globals.PROJECT_UPDATE_FLUSH_EVERY):
         for project in projects:
             # analyse_baseline_scenario(project.project_id)
-            activities = analyse_project_activities(project.project_id)
+            activities = analyse_project_activities(project.project_id, project)
             file.write("::: Project " + project.project_id + '\n')
             for activity in activities:
                 file.write(activity + '\n')
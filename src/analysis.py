@@ -1,6 +1,10 @@
 import json
 import re
 import src.database as database
+import src.downloader as downloader
+from src.document import Document
+import globals
+from src.section_extraction import extract_section_text
 from dotenv import load_dotenv
 import os
 import openai
@@ -11,7 +15,7 @@ load_dotenv()
 openai_api_key: str = os.environ.get("OPENAI_API_KEY")
 
 
-def analyse_project_activities(project_id):
+def analyse_project_activities(project_id, project=None):
     logger = logging.getLogger('MyApp')
     logger.info('analysing project activities')
     system_prompt = "You are tasked to analyze a section from a carbon removal project's documentation focusing " \
@@ -47,7 +51,7 @@ def analyse_project_activities(project_id):
         },
     }]
     relevant_document_types = [11, 13]
-    file = extract_project_and_document(project_id, relevant_document_types)
+    file = extract_project_and_document(project_id, relevant_document_types, project)
     if not file:
         database.store_project_attribute(project_id, "project_activities", "No file found to analyse")
         return ["No file found to analyse"]
@@ -60,6 +64,10 @@ def analyse_project_activities(project_id):
     else:
         return ["Invalid document version. Expected a document using the VCS template Version of 3 or 4."]
     extracted_text = call_relevant_text_extraction(headings, file.text)
+    if not extracted_text and len(file.text) == database.CSV_FIELD_LIMIT:
+        # texts imported from the old CSV store were cut at exactly CSV_FIELD_LIMIT characters, the section may lie
+        # beyond the cut, read it from the PDF. Complete texts without the section are not downloaded again
+        extracted_text = call_relevant_text_extraction(headings, section_text_from_pdf(file, headings))
     if len(extracted_text) > 30000:
         logger.info("extracted text was shortened, as original character length was " + str(len(extracted_text)))
         extracted_text = extracted_text[:30000]
@@ -74,9 +82,14 @@ def analyse_project_activities(project_id):
     return result
 
 
-def extract_project_and_document(project_id, relevant_document_types):
+def extract_project_and_document(project_id, relevant_document_types, project=None):
     logger = logging.getLogger('MyApp')
-    analysed_project = database.get_project_by_id(project_id)
+    if project:
+        # the project row is already loaded, only fetch its documents instead of re-reading projects.csv
+        analysed_project = project
+        analysed_project.documents = database.retrieve_project_documents(project_id)
+    else:
+        analysed_project = database.get_project_by_id(project_id)
     filtered_documents = [doc for doc in analysed_project.documents if int(doc.doc_type) in relevant_document_types]
     if not filtered_documents:
         return None
@@ -92,6 +105,26 @@ def extract_project_and_document(project_id, relevant_document_types):
     return analysed_document
 
 
+def section_text_from_pdf(document, headings):
+    logger = logging.getLogger('MyApp')
+    spill_path = os.path.join(globals.TEMP_DOC_STORAGE, f"{document.project_id}_{document.doc_id}_section.pdf")
+    try:
+        content = downloader.get_downloader().download_buffer(document.url, spill_path, globals.DOCUMENT_SPILL_BYTES)
+        source = spill_path if content is None else content
+        # only the pages of the target sections are extracted, the full text stays the one in the document store
+        section_texts = [extract_section_text(source, heading) for heading in headings]
+    except Exception as e:
+        logger.info(f"Reading the sections {headings} from {document.filename} failed due to the following error: {e}")
+        return ""
+    finally:
+        if os.path.exists(spill_path):
+            os.remove(spill_path)
+    section_document = Document(document.doc_id, document.project_id, document.filename, None, None, None,
+                                text=''.join(text for text in section_texts if text))
+    section_document.preprocess_text()
+    return section_document.text
+
+
 def call_relevant_text_extraction(target_headings, document_text):
     target_text = ""
     for target_heading in target_headings:
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from pyppeteer import launch
+import globals
+
+
+class BrowserPool:
+    # a few long-lived headless browsers handing out pages, at most pages_per_browser pages are open per browser
+
+    def __init__(self, size=1, pages_per_browser=4, launch_options=None):
+        self.size = size
+        self.pages_per_browser = pages_per_browser
+        self.launch_options = launch_options or {}
+        self.browsers = [None] * size
+        self.open_pages = [0] * size
+        self.semaphore = asyncio.Semaphore(size * pages_per_browser)
+        self.lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def page(self):
+        async with self.semaphore:
+            index, browser = await self.acquire_browser()
+            page = None
+            try:
+                page = await browser.newPage()
+                yield page
+            except Exception:
+                # a crashed browser is replaced before the next page is handed out
+                if not await self.is_healthy(browser):
+                    await self.restart(index, browser)
+                raise
+            finally:
+                self.open_pages[index] -= 1
+                if page is not None:
+                    try:
+                        await page.close()
+                    except Exception:
+                        pass
+
+    async def acquire_browser(self):
+        async with self.lock:
+            index = min(range(self.size), key=lambda i: self.open_pages[i])
+            browser = self.browsers[index]
+            if browser is None or not await self.is_healthy(browser):
+                browser = await self.start_browser(index, browser)
+            self.open_pages[index] += 1
+            return index, browser
+
+    async def start_browser(self, index, old_browser=None):
+        logger = logging.getLogger('MyApp')
+        if old_browser is not None:
+            logger.info(f'Browser {index} of the pool is not responding, restarting it.')
+            await self.close_browser(old_browser)
+        else:
+            logger.info(f'Launching browser {index} of the pool.')
+        browser = await launch(**self.launch_options)
+        self.browsers[index] = browser
+        return browser
+
+    async def restart(self, index, browser):
+        async with self.lock:
+            if self.browsers[index] is browser:
+                await self.start_browser(index, browser)
+
+    @staticmethod
+    async def is_healthy(browser):
+        process = browser.process
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            await asyncio.wait_for(browser.version(), timeout=10)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    async def close_browser(browser):
+        try:
+            await browser.close()
+        except Exception:
+            pass
+
+    async def close(self):
+        async with self.lock:
+            for index, browser in enumerate(self.browsers):
+                if browser is not None:
+                    await self.close_browser(browser)
+                    self.browsers[index] = None
+
+
+pool = None
+
+
+def get_pool():
+    global pool
+    if pool is None:
+        pool = BrowserPool(globals.BROWSER_POOL_SIZE, globals.BROWSER_PAGES_PER_BROWSER)
+    return pool
+
+
+async def close_pool():
+    global pool
+    if pool is not None:
+        await pool.close()
+        pool = None
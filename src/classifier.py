@@ -0,0 +1,103 @@
+import re
+import globals
+
+# title markers of the document types as (text, case-insensitive), named after the rules in Document that use them
+TEXT_MARKERS = {
+    'listing_representation': ("VCS LISTING REPRESENTATION", False),
+    'registration_deed': ("VCS REGISTRATION DEED OF REPRESENTATION", False),
+    'issuance_deed': ("VCS ISSUANCE DEED OF REPRESENTATION", False),
+    'validation_deed': ("VCS VALIDATION DEED OF REPRESENTATION", False),
+    'verification_deed': ("VCS VERIFICATION DEED OF REPRESENTATION", False),
+    'communications_agreement': ("VERRA REGISTRY COMMUNICATIONS AGREEMENT", False),
+    'agency_declaration': ("DECLARATION OF AGENCY AND COMMUNICATIONS AGREEMENT", False),
+    'ccb_project_description': ("CCB & VCS PROJECT DESCRIPTION", False),
+    'project_description': ("Project Description: VCS Version ", False),
+    'project_description_upper': ("PROJECT DESCRIPTION: VCS Version ", False),
+    'monitoring_report': ("MONITORING REPORT:", False),
+    'joint_pd_mr': ("Joint Project Description & Monitoring Report: VCS Version ", False),
+    'validation_report': ("validation report: vcs version ", True),
+    'ccb_validation_report': ("CCB & VCS VALIDATION REPORT:", False),
+    'verification_report': ("verification report: vcs version ", True),
+    'ccb_verification_report': ("CCB & VCS VERIFICATION REPORT:", False),
+    'joint_vr_vr': ("joint validation & verification report: vcs version ", True),
+}
+
+# all markers are matched in one scan of the lowercased window with a plain literal alternation, which the regex
+# engine can skip through quickly, the case-sensitive ones are then confirmed against the original text
+MARKER_PATTERN = re.compile('|'.join(sorted({re.escape(text.lower()) for text, _ in TEXT_MARKERS.values()},
+                                            key=len, reverse=True)))
+PD_PATTERN = re.compile(r'(?<![a-zA-Z])PD(?![a-zA-Z])')
+MR_PATTERN = re.compile(r'(?<![a-zA-Z])MR(?![a-zA-Z])')
+PRR_PATTERN = re.compile(r'(?<![a-zA-Z])PRR(?![a-zA-Z])')
+
+# (marker names, filename words that all have to be present, doc type), the first match wins
+LEGAL_RULES = [
+    ({'listing_representation'}, ('listing', 'representation'), globals.VCS_LISTING_REPRESENTATION),
+    ({'registration_deed'}, ('registration', 'representation'), globals.VCS_REGISTRATION_DEED_OF_REPRESENTATION),
+    ({'issuance_deed'}, ('issuance', 'representation'), globals.VCS_ISSUANCE_DEED_OF_REPRESENTATION),
+    ({'validation_deed'}, ('validation', 'representation'), globals.VCS_VALIDATION_DEED_OF_REPRESENTATION),
+    ({'verification_deed'}, ('verification', 'representation'), globals.VCS_VERIFICATION_DEED_OF_REPRESENTATION),
+    ({'communications_agreement', 'agency_declaration'}, ('communications', 'agreement'),
+     globals.VERRA_REGISTRY_COMMUNICATIONS_AGREEMENT),
+]
+
+
+def text_markers(text, window=None):
+    # the names of the markers in the first `window` characters, the whole text without a window. Without a window this
+    # is slower than the is_* rules, which search with `in` and stop at the first hit of each marker
+    window_text = text[:window] if window else text
+    lowered = window_text.lower()
+    if len(lowered) != len(window_text):
+        # a few characters lowercase to more than one, positions in both texts no longer line up
+        return {name for name, (marker, ignore_case) in TEXT_MARKERS.items()
+                if (marker.lower() in lowered if ignore_case else marker in window_text)}
+    markers = set()
+    position = 0
+    while True:
+        match = MARKER_PATTERN.search(lowered, position)
+        if match is None:
+            return markers
+        start = match.start()
+        # markers may start inside each other, so the scan resumes right after the start of the match
+        for name, (marker, ignore_case) in TEXT_MARKERS.items():
+            if lowered.startswith(marker.lower(), start) and (ignore_case or window_text.startswith(marker, start)):
+                markers.add(name)
+        position = start + 1
+
+
+def classify(filename, text, doc_type=0, window=None):
+    # same result as Document.apply_classification_rules, which runs the is_* rules one after the other over the
+    # whole text, as long as the title markers fall into the window
+    markers = text_markers(text, window)
+    name = filename.lower()
+
+    if name.endswith(".pdf"):
+        for rule_markers, words, legal_type in LEGAL_RULES:
+            if markers & rule_markers or all(word in name for word in words):
+                doc_type = legal_type
+                break
+
+    if doc_type == 0 and (('proj' in name and 'desc' in name) or PD_PATTERN.search(filename) or
+                          markers & {'ccb_project_description', 'project_description', 'project_description_upper'}):
+        doc_type = globals.PROJECT_DESCRIPTION
+    if doc_type == 0 and ('monitoring' in name or MR_PATTERN.search(filename) or 'monitoring_report' in markers):
+        doc_type = globals.MONITORING_REPORT
+    if doc_type in (0, globals.PROJECT_DESCRIPTION, globals.MONITORING_REPORT) and \
+            (('joint' in name and ('description' in name or 'monitoring' in name)) or 'joint_pd_mr' in markers):
+        doc_type = globals.JOINT_PD_AND_MR
+    if doc_type == 0 and (('val' in name and 'report' in name) or
+                          markers & {'validation_report', 'ccb_validation_report'}):
+        doc_type = globals.VALIDATION_REPORT
+    if doc_type == 0 and (('ver' in name and 'report' in name) or
+                          markers & {'verification_report', 'ccb_verification_report'}):
+        doc_type = globals.VERIFICATION_REPORT
+    if doc_type == 0 and (('joint' in name and 'val' in name and 'ver' in name) or 'joint_vr_vr' in markers):
+        doc_type = globals.JOINT_VR_VR
+    # the two filename word checks of is_prr never match, see the operator precedence there, only the PRR token does
+    if PRR_PATTERN.search(filename):
+        doc_type = globals.PROJECT_REVIEW_REPORT
+    if filename.endswith(".kml"):
+        doc_type = globals.MAPPING_OF_AREA
+    if doc_type == 0:
+        doc_type = globals.OTHER
+    return doc_type
@@ -0,0 +1,108 @@
+import logging
+import math
+from collections import Counter
+import pandas as pd
+import src.database as database
+
+LENGTH_PERCENTILES = [10, 25, 50, 75, 90, 99]
+# text lengths are counted in geometric buckets that are 2^(1/8) (~9%) wide, so the percentiles need constant
+# memory and are accurate to about half a bucket
+LENGTH_BUCKETS_PER_OCTAVE = 8
+DOC_TYPE_OCCURRENCES = ['0x', '1x', '2x', '3x', '4x', 'more']
+
+
+def corpus_statistics():
+    logger = logging.getLogger('MyApp')
+    logger.info('Calculating corpus statistics from document store')
+
+    doc_type_histogram = {}
+    languages = Counter()
+    sections = Counter()
+    length_buckets = Counter()
+    documents = 0
+    projects = 0
+    current_project = None
+    current_doc_types = Counter()
+
+    # rows arrive in primary key order, so one project's documents are consecutive and only the current project's
+    # counts are held in memory
+    connection = database.connect_documents_db()
+    rows = connection.execute(
+        "SELECT d.project_id, d.doc_type, d.language, d.website_category, i.text_length "
+        "FROM documents d LEFT JOIN text_index i ON i.project_id = d.project_id AND i.doc_id = d.doc_id "
+        "ORDER BY d.project_id"
+    )
+    for project_id, doc_type, language, section, text_length in rows:
+        if project_id != current_project:
+            add_project_doc_types(doc_type_histogram, current_doc_types)
+            current_project = project_id
+            current_doc_types = Counter()
+            projects += 1
+        documents += 1
+        current_doc_types[str(doc_type)] += 1
+        languages[language] += 1
+        sections[section] += 1
+        length_buckets[length_bucket(text_length or 0)] += 1
+    add_project_doc_types(doc_type_histogram, current_doc_types)
+    connection.close()
+
+    # projects without a document of a type never show up in the scan, they make up the 0x bucket
+    for occurrences in doc_type_histogram.values():
+        occurrences[0] = projects - sum(occurrences.values())
+
+    return {
+        "projects": projects,
+        "documents": documents,
+        "doc_types": {doc_type: dict(sorted(occurrences.items()))
+                      for doc_type, occurrences in sorted(doc_type_histogram.items())},
+        "languages": dict(languages.most_common()),
+        "sections": dict(sections.most_common()),
+        "text_length_percentiles": length_percentiles(length_buckets, documents)
+    }
+
+
+def add_project_doc_types(doc_type_histogram, project_doc_types):
+    for doc_type, count in project_doc_types.items():
+        doc_type_histogram.setdefault(doc_type, Counter())[count] += 1
+
+
+def length_bucket(text_length):
+    if text_length < 1:
+        return 0
+    return math.floor(math.log2(text_length) * LENGTH_BUCKETS_PER_OCTAVE) + 1
+
+
+def bucket_length(bucket):
+    if bucket == 0:
+        return 0
+    # geometric middle of the bucket
+    return round(2 ** ((bucket - 0.5) / LENGTH_BUCKETS_PER_OCTAVE))
+
+
+def length_percentiles(length_buckets, documents):
+    percentiles = {}
+    if documents == 0:
+        return percentiles
+    seen = 0
+    targets = iter(LENGTH_PERCENTILES)
+    target = next(targets)
+    for bucket in sorted(length_buckets):
+        seen += length_buckets[bucket]
+        while target is not None and seen >= documents * target / 100:
+            percentiles[f"p{target}"] = bucket_length(bucket)
+            target = next(targets, None)
+    return percentiles
+
+
+def doc_type_metrics(report=None):
+    # number of projects holding a document type 0, 1, 2, 3, 4 or more times
+    report = report or corpus_statistics()
+    metrics = []
+    for doc_type, occurrences in report["doc_types"].items():
+        row = {"doc_type": doc_type}
+        for count, projects in occurrences.items():
+            column = DOC_TYPE_OCCURRENCES[min(count, len(DOC_TYPE_OCCURRENCES) - 1)]
+            row[column] = row.get(column, 0) + projects
+        metrics.append(row)
+    return pd.DataFrame(metrics, columns=["doc_type"] + DOC_TYPE_OCCURRENCES).fillna(0).astype(
+        {column: int for column in DOC_TYPE_OCCURRENCES})
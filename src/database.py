@@ -4,53 +4,256 @@ from dotenv import load_dotenv
 from supabase import create_client, Client
 from datetime import datetime
 from src.document import Document
+from src.text_store import TextStore
+from src.journal import Journal, file_lock
+import src.search as search
 import logging
+import sqlite3
 import tempfile
+import threading
+from contextlib import contextmanager
 
 load_dotenv()
 url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_KEY")
+# set JOURNALED_STORAGE=1 when several scrape / analyse workers share the data directory
+journaled_storage: bool = os.environ.get("JOURNALED_STORAGE") == "1"
 
 supabase: Client = create_client(url, key)
 
 PROJECTS_CSV = 'data/projects.csv'
 DOCUMENTS_CSV = 'data/documents.csv'
+DOCUMENTS_DB = 'data/documents.db'
+PROJECTS_LOCK = 'data/projects.lock'
+PROJECTS_JOURNAL = 'data/projects.journal'
+JOURNAL_COMPACT_BYTES = 50 * 1024 * 1024
+# longest field the CSV files hold, document texts of the old documents.csv were cut at this length
+CSV_FIELD_LIMIT = 2000000
+
+# document metadata lives in the compact documents table, the extracted text is compressed into the text store
+# and located through the text_index table
+DOCUMENT_COLUMNS = ['doc_id', 'project_id', 'filename', 'website_category', 'last_updated', 'url', 'language',
+                    'doc_type']
+
+
+text_store = TextStore()
+project_journal = Journal(PROJECTS_JOURNAL)
+
+# open ProjectUpdateSession buffering project attribute updates, see project_update_session
+update_session = None
 
 
 def read_csv(file_path):
+    # projects.csv carries the rendered website of every project in a single field
+    csv.field_size_limit(CSV_FIELD_LIMIT)
     with open(file_path, mode='r', encoding='utf-8') as file:
         return list(csv.DictReader(file))
 
 
+def connect_documents_db():
+    # WAL lets readers keep a consistent snapshot while other workers write, writers wait for each other
+    connection = sqlite3.connect(DOCUMENTS_DB, timeout=60)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS documents ("
+        "doc_id INTEGER NOT NULL, "
+        "project_id INTEGER NOT NULL, "
+        "filename TEXT, "
+        "website_category TEXT, "
+        "last_updated TEXT, "
+        "url TEXT, "
+        "language TEXT, "
+        "doc_type INTEGER, "
+        "PRIMARY KEY (project_id, doc_id))"
+    )
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS text_index ("
+        "project_id INTEGER NOT NULL, "
+        "doc_id INTEGER NOT NULL, "
+        "blob_offset INTEGER NOT NULL, "
+        "blob_size INTEGER NOT NULL, "
+        "codec TEXT NOT NULL, "
+        "text_length INTEGER NOT NULL, "
+        "PRIMARY KEY (project_id, doc_id))"
+    )
+    return connection
+
+
+def index_document_text(connection, project_id, doc_id, text):
+    blob_offset, blob_size, codec = text_store.append(text)
+    connection.execute(
+        "INSERT OR REPLACE INTO text_index (project_id, doc_id, blob_offset, blob_size, codec, text_length) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (int(project_id), int(doc_id), blob_offset, blob_size, codec, len(text))
+    )
+    return blob_offset, blob_size, codec
+
+
 def write_csv(file_path, data, fieldnames):
-    with open(file_path, mode='w', newline='', encoding='utf-8') as file:
+    # write next to the target and rename, so a crash never leaves a half-written file behind
+    directory = os.path.dirname(file_path) or '.'
+    with tempfile.NamedTemporaryFile(mode='w', delete=False, newline='', encoding='utf-8', dir=directory,
+                                     suffix='.tmp') as file:
         writer = csv.DictWriter(file, fieldnames=fieldnames)
         writer.writeheader()
         writer.writerows(data)
+    os.replace(file.name, file_path)
 
 
-def update_project_list(project_ids):
-    from src.project import Project
+def read_projects():
+    # the shared lock keeps compaction and full rewrites out while the CSV and the journal are read
+    with file_lock(PROJECTS_LOCK, exclusive=False):
+        projects = read_projects_unlocked()
+    if update_session:
+        with update_session.lock:
+            for p in projects:
+                p.update(update_session.updates.get(p['project_id'], {}))
+    return projects
+
+
+def read_projects_unlocked():
+    projects = read_csv(PROJECTS_CSV)
+    journal_updates = replay_project_journal()
+    if journal_updates:
+        for p in projects:
+            p.update(journal_updates.get(p['project_id'], {}))
+    return projects
+
+
+def replay_project_journal():
+    updates = {}
+    for record in project_journal.replay():
+        updates.setdefault(record['project_id'], {}).update(record['attributes'])
+    return updates
+
+
+def apply_project_updates(updates):
     logger = logging.getLogger('MyApp')
-    logger.info('Updating project list using CSV files')
+    if journaled_storage:
+        logger.info(f'Appending attribute updates for {len(updates)} project(s) to the project journal')
+        with file_lock(PROJECTS_LOCK):
+            project_journal.append([{'project_id': project_id, 'attributes': attributes}
+                                    for project_id, attributes in updates.items()])
+        if project_journal.size() > JOURNAL_COMPACT_BYTES:
+            compact_project_journal()
+        return
+
+    logger.info(f'Writing attribute updates for {len(updates)} project(s) to CSV file')
+    with file_lock(PROJECTS_LOCK):
+        rewrite_projects(updates)
 
-    # Read existing projects from CSV
-    existing_projects = read_csv(PROJECTS_CSV)
-    existing_project_ids = [item['project_id'] for item in existing_projects]
 
-    # Update logic
-    for project_id in project_ids:
-        if project_id not in existing_project_ids:
-            current_project = Project(project_id)
-            project_dict = current_project.to_dict()
-            existing_projects.append(project_dict)
-            logger.info(f"Added project {project_id}")
+def rewrite_projects(updates):
+    # Read existing projects from CSV
+    projects = read_csv(PROJECTS_CSV)
+    fieldnames = list(projects[0].keys()) if projects else ['project_id']
 
-    # Remove projects that are no longer in the list
-    updated_projects = [p for p in existing_projects if p['project_id'] in project_ids]
+    # Update the projects' attributes
+    for p in projects:
+        for attribute, value in updates.get(p['project_id'], {}).items():
+            if attribute not in fieldnames:
+                fieldnames.append(attribute)
+            p[attribute] = value
 
     # Write updated projects back to CSV
-    write_csv(PROJECTS_CSV, updated_projects, existing_projects[0].keys() if existing_projects else ['project_id'])
+    write_csv(PROJECTS_CSV, projects, fieldnames)
+
+
+def compact_project_journal():
+    logger = logging.getLogger('MyApp')
+    if project_journal.size() == 0:
+        return
+    with file_lock(PROJECTS_LOCK):
+        updates = replay_project_journal()
+        if updates:
+            logger.info(f'Compacting journaled updates for {len(updates)} project(s) into CSV file')
+            rewrite_projects(updates)
+        project_journal.truncate()
+
+
+def csv_value(value):
+    # the value as the CSV file holds it, so journaled and pending updates read back like rows of the CSV file
+    return "" if value is None else str(value)
+
+
+def queue_project_update(project_id, attributes):
+    attributes = {attribute: csv_value(value) for attribute, value in attributes.items()}
+    if update_session:
+        update_session.add(str(project_id), attributes)
+    else:
+        apply_project_updates({str(project_id): attributes})
+
+
+class ProjectUpdateSession:
+
+    def __init__(self, flush_every=1):
+        self.flush_every = flush_every
+        self.updates = {}
+        self.flushes = 0
+        # pages rendered on the event loop and documents handled on a worker thread share one session
+        self.lock = threading.RLock()
+
+    def add(self, project_id, attributes):
+        with self.lock:
+            # a new project arriving when the buffer is full flushes the finished ones first
+            if project_id not in self.updates and len(self.updates) >= self.flush_every:
+                self.flush()
+            self.updates.setdefault(project_id, {}).update(attributes)
+
+    def flush(self):
+        with self.lock:
+            if self.updates:
+                apply_project_updates(self.updates)
+                self.updates = {}
+                self.flushes += 1
+
+
+@contextmanager
+def project_update_session(flush_every=1):
+    # collects store_project_attribute / store_website_content calls in memory and rewrites projects.csv once
+    # every flush_every projects instead of once per attribute
+    global update_session
+    if update_session:
+        yield update_session
+        return
+    update_session = ProjectUpdateSession(flush_every)
+    try:
+        yield update_session
+    finally:
+        session, update_session = update_session, None
+        session.flush()
+        logging.getLogger('MyApp').info(f'Project update session finished after {session.flushes} CSV rewrite(s)')
+
+
+def update_project_list(project_ids):
+    from src.project import Project
+    logger = logging.getLogger('MyApp')
+    logger.info('Updating project list using CSV files')
+
+    with file_lock(PROJECTS_LOCK):
+        # Read existing projects from CSV, including journaled updates that are folded into the rewrite
+        existing_projects = read_projects_unlocked()
+        # ids read from the CSV are strings, ids from the registry export are numbers
+        existing_project_ids = {str(item['project_id']) for item in existing_projects}
+        listed_project_ids = {str(project_id) for project_id in project_ids}
+
+        # Update logic
+        for project_id in project_ids:
+            if str(project_id) not in existing_project_ids:
+                current_project = Project(project_id)
+                project_dict = current_project.to_dict()
+                existing_projects.append(project_dict)
+                existing_project_ids.add(str(project_id))
+                logger.info(f"Added project {project_id}")
+
+        # Remove projects that are no longer in the list
+        updated_projects = [p for p in existing_projects if str(p['project_id']) in listed_project_ids]
+
+        # Write updated projects back to CSV
+        fieldnames = list(dict.fromkeys(key for p in existing_projects for key in p)) or ['project_id']
+        write_csv(PROJECTS_CSV, updated_projects, fieldnames)
+        project_journal.truncate()
 
     logger.info(f"{len(updated_projects)} projects now in the CSV file")
 
@@ -61,7 +264,7 @@ def retrieve_db_project_list():
     logger.info('Retrieving project list from CSV file')
 
     # Read projects from CSV
-    projects_data = read_csv(PROJECTS_CSV)
+    projects_data = read_projects()
 
     if len(projects_data) > 0:
         projects = [Project(
@@ -78,7 +281,9 @@ def retrieve_db_project_list():
             hectares=item['hectares'],
             vcs_project_validator=item['vcs_project_validator'],
             registration_date=datetime.fromisoformat(item['registration_date']) if item['registration_date'] else None,
-            crediting_period_term=item['crediting_period_term']
+            crediting_period_term=item['crediting_period_term'],
+            documents_fingerprint=item.get('documents_fingerprint') or None,
+            last_document_sync=datetime.fromisoformat(item['last_document_sync']) if item.get('last_document_sync') else None
         ) for item in projects_data]
         return projects
     return []
@@ -87,156 +292,123 @@ def retrieve_db_project_list():
 def store_website_content(project, website_content):
     logger = logging.getLogger('MyApp')
     logger.info(f'Storing website content for project {project.project_id} in CSV file')
-
-    # Read existing projects from CSV
-    projects = read_csv(PROJECTS_CSV)
-
-    # Update the project
-    for p in projects:
-        if p['project_id'] == project.project_id:
-            p['website_soup'] = website_content
-            p['last_website_retrieval'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            break
-
-    # Write updated projects back to CSV
-    write_csv(PROJECTS_CSV, projects, projects[0].keys())
+    queue_project_update(project.project_id, {
+        'website_soup': website_content,
+        'last_website_retrieval': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    })
 
 
 def store_project_attribute(project_id, attribute, value):
     logger = logging.getLogger('MyApp')
     logger.info(f'Storing {attribute} for project {project_id} in CSV file')
+    queue_project_update(project_id, {attribute: value})
 
 
-    # Read existing projects from CSV
-    projects = read_csv(PROJECTS_CSV)
-
-    # Update the project's attribute
-    for p in projects:
-        if p['project_id'] == project_id:
-            p[attribute] = value
-            break
-
-    # Write updated projects back to CSV
-    write_csv(PROJECTS_CSV, projects, projects[0].keys())
+def retrieve_existing_project_documents(project):
+    return retrieve_project_documents(project.project_id)
 
 
-def retrieve_existing_project_documents(project):
-    csv.field_size_limit(2000000)
+def retrieve_project_documents(project_id):
     logger = logging.getLogger('MyApp')
-    logger.info(f'Retrieving existing documents for project {project.project_id} from CSV file')
+    logger.info(f'Retrieving existing documents for project {project_id} from document store')
 
-    documents = []
+    # range scan on the (project_id, doc_id) primary key, only this project's rows are read
+    connection = connect_documents_db()
+    rows = connection.execute(
+        "SELECT * FROM documents WHERE project_id = ? ORDER BY doc_id", (int(project_id),)
+    ).fetchall()
+    connection.close()
 
-    with open(DOCUMENTS_CSV, mode='r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            if int(row['project_id']) == int(project.project_id):
-                doc_to_append = Document(
-                    doc_id=int(row['doc_id']),
-                    project_id=int(row['project_id']),
-                    filename=row['filename'],
-                    website_category=row['website_category'],
-                    last_updated=datetime.fromisoformat(row['last_updated']) if row['last_updated'] else None,
-                    url=row['url'],
-                    text=row['text'],
-                    language=row['language'],
-                    doc_type=row['doc_type']
-                )
-                documents.append(doc_to_append)
+    # only metadata is loaded here, Document.text is read from the text store on first access
+    documents = []
+    for row in rows:
+        documents.append(Document(
+            doc_id=row['doc_id'],
+            project_id=row['project_id'],
+            filename=row['filename'],
+            website_category=row['website_category'],
+            last_updated=datetime.fromisoformat(row['last_updated']) if row['last_updated'] else None,
+            url=row['url'],
+            text=None,
+            language=row['language'],
+            doc_type=row['doc_type']
+        ))
     return documents
 
 
+def retrieve_document_text(project_id, doc_id):
+    connection = connect_documents_db()
+    row = connection.execute(
+        "SELECT blob_offset, blob_size, codec FROM text_index WHERE project_id = ? AND doc_id = ?",
+        (int(project_id), int(doc_id))
+    ).fetchone()
+    connection.close()
+    return text_store.read(row['blob_offset'], row['blob_size'], row['codec']) if row else ""
+
+
 def store_document(document):
-    csv.field_size_limit(2000000)
+    return store_documents([document])
+
+
+def store_documents(documents):
+    # True once the documents are stored, False when storing failed, the caller has to treat them as not synced
     logger = logging.getLogger('MyApp')
-    logger.info(f'Storing document {document.filename} in CSV file')
+    filenames = ', '.join(document.filename for document in documents)
+    logger.info(f'Storing documents {filenames} in document store')
     try:
-        document_dict = document.to_dict()
-
-        with open(DOCUMENTS_CSV, mode='r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            original_fieldnames = reader.fieldnames
-            all_fieldnames = set(original_fieldnames).union(document_dict.keys())
-
-            with tempfile.NamedTemporaryFile(mode='w', delete=False, newline='', encoding='utf-8') as temp_file:
-                writer = csv.DictWriter(temp_file, fieldnames=all_fieldnames)
-                writer.writeheader()
-
-                found = False
-                for row in reader:
-                    if row['doc_id'] == document.doc_id and row['project_id'] == document.project_id:
-                        writer.writerow(document_dict)
-                        found = True
-                    else:
-                        # Fill missing keys with empty values for existing rows
-                        for key in all_fieldnames:
-                            row.setdefault(key, '')
-                        writer.writerow(row)
-
-                if not found:
-                    print(len(document_dict['text']))
-                    if len(document_dict['text']) > 2000000:
-                        document_dict['text'] = document_dict['text'][:2000000]
-                    writer.writerow(document_dict)
-
-        os.replace(temp_file.name, DOCUMENTS_CSV)
+        document_dicts = [document.to_dict() for document in documents]
+
+        # upsert on the (project_id, doc_id) key, so only the affected rows are written, one transaction per batch
+        connection = connect_documents_db()
+        with connection:
+            connection.executemany(
+                f"INSERT OR REPLACE INTO documents ({', '.join(DOCUMENT_COLUMNS)}) "
+                f"VALUES ({', '.join(':' + column for column in DOCUMENT_COLUMNS)})",
+                document_dicts
+            )
+            search_entries = [(document_dict['project_id'], document_dict['doc_id'], document_dict['text'],
+                               index_document_text(connection, document_dict['project_id'], document_dict['doc_id'],
+                                                   document_dict['text']))
+                              for document_dict in document_dicts]
+        connection.close()
+        search.store_search_texts(search_entries)
+        return True
 
     except Exception as e:
-        logger.info(f"Storing document {document.filename} in CSV file failed due to the following error: {e}")
-        if os.path.exists(temp_file.name):
-            os.remove(temp_file.name)
+        logger.info(f"Storing documents {filenames} in document store failed due to the following error: {e}")
+        return False
 
 
-def doc_type_metrics():
+def migrate_documents_csv(csv_path=DOCUMENTS_CSV):
     logger = logging.getLogger('MyApp')
-    logger.info('Calculating document type metrics from CSV file')
-
-    # Read documents from CSV
-    documents = read_csv(DOCUMENTS_CSV)
-
-    # Process data
-    result_dict = {}
-    for d in documents:
-        project_id = d['project_id']
-        doc_type = d['doc_type']
-
-        if project_id not in result_dict:
-            result_dict[project_id] = {doc_type: 1}
-        else:
-            result_dict[project_id][doc_type] = result_dict[project_id].get(doc_type, 0) + 1
-
-    print(result_dict)
-
-    # Calculate frequencies for specific document types
-    calc_freq_for_doc_type(result_dict, '11')
-    calc_freq_for_doc_type(result_dict, '12')
-    calc_freq_for_doc_type(result_dict, '13')
-    calc_freq_for_doc_type(result_dict, '61')
-
-
-def calc_freq_for_doc_type(result_dict, doc_type):
-    zero = 0
-    one = 0
-    two = 0
-    three = 0
-    four = 0
-    more = 0
-    for project_id, doc_types in result_dict.items():
-        if doc_type in doc_types:
-            if doc_types[doc_type] == 0:
-                zero += 1
-            elif doc_types[doc_type] == 1:
-                one += 1
-            elif doc_types[doc_type] == 2:
-                two += 1
-            elif doc_types[doc_type] == 3:
-                three += 1
-            elif doc_types[doc_type] == 4:
-                four += 1
-            else:
-                more += 1
-    print(f"document of type {doc_type} is distributed across projects as follows: 0x: {zero}, 1x: {one}, 2x: {two}, "
-          f"3x: {three}, 4x: {four}, more: {more}")
+    if not os.path.exists(csv_path):
+        logger.info(f'No {csv_path} found, nothing to migrate into the document store')
+        return 0
+
+    connection = connect_documents_db()
+    if connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0] > 0:
+        logger.info('Document store already contains documents, skipping CSV migration')
+        connection.close()
+        return 0
+
+    logger.info(f'Migrating documents from {csv_path} into the document store')
+    csv.field_size_limit(CSV_FIELD_LIMIT)
+    migrated = 0
+    with open(csv_path, mode='r', encoding='utf-8') as file, connection:
+        reader = csv.DictReader(file)
+        for row in reader:
+            connection.execute(
+                f"INSERT OR REPLACE INTO documents ({', '.join(DOCUMENT_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in DOCUMENT_COLUMNS)})",
+                (int(row['doc_id']), int(row['project_id']), row['filename'], row['website_category'],
+                 row['last_updated'], row['url'], row['language'], int(row['doc_type']))
+            )
+            index_document_text(connection, row['project_id'], row['doc_id'], row.get('text', ''))
+            migrated += 1
+    connection.close()
+    logger.info(f'Migrated {migrated} documents into the document store')
+    search.rebuild_search_index()
+    return migrated
 
 
 def get_project_by_id(project_id):
@@ -244,10 +416,10 @@ def get_project_by_id(project_id):
     logger = logging.getLogger('MyApp')
     logger.info(f'Getting project with ID {project_id} from CSV file')
 
-    projects = read_csv(PROJECTS_CSV)
+    projects = read_projects()
 
     for project_data in projects:
-        if project_data['project_id'] == project_id:
+        if project_data['project_id'] == str(project_id):
             project = Project(
                 project_id=int(project_data['project_id']),
                 website_soup=project_data['website_soup'],
@@ -262,7 +434,9 @@ def get_project_by_id(project_id):
                 hectares=project_data['hectares'],
                 vcs_project_validator=project_data['vcs_project_validator'],
                 registration_date=datetime.fromisoformat(project_data['registration_date']) if project_data['registration_date'] else None,
-                crediting_period_term=project_data['crediting_period_term']
+                crediting_period_term=project_data['crediting_period_term'],
+                documents_fingerprint=project_data.get('documents_fingerprint') or None,
+                last_document_sync=datetime.fromisoformat(project_data['last_document_sync']) if project_data.get('last_document_sync') else None
             )
             project.documents = retrieve_existing_project_documents(project)
             return project
@@ -1,11 +1,15 @@
-from pdfminer.high_level import extract_text
-from langdetect import detect
 import globals
 import logging
 import re
+import src.extraction_backends as extraction_backends
+import src.classifier as classifier
+import src.language as language_detection
+from src.normaliser import default_normaliser
 
 
 class Document:
+    __slots__ = ('doc_id', 'project_id', 'filename', 'website_category', 'last_updated', 'url', '_text', 'doc_type',
+                 'language')
 
     def __init__(self, doc_id, project_id, filename, website_category, last_updated, url, text="", doc_type=0,
                  language="not detected"):
@@ -15,22 +19,37 @@ class Document:
         self.website_category = website_category
         self.last_updated = last_updated
         self.url = url
-        self.text = text
+        # text=None marks a stored document whose text is only read from the text store when accessed
+        self._text = text
         self.doc_type = doc_type
         self.language = language
 
-    def analyse_doc(self):
-        self.extract_text()
+    @property
+    def text(self):
+        if self._text is None:
+            from src.database import retrieve_document_text
+            self._text = retrieve_document_text(self.project_id, self.doc_id)
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        self._text = value
+
+    def analyse_doc(self, source=None):
+        self.extract_text(source)
         self.classify_doc()
         self.analyse_language()
 
-    def extract_text(self):
+    def extract_text(self, source=None):
+        # source is the downloaded content as bytes or the path of the downloaded file
         logger = logging.getLogger('MyApp')
         logger.info(f"extracting text from {self.filename}")
         if self.filename.lower().endswith(".pdf"):
             try:
-                self.text = extract_text(globals.TEMP_DOC_STORAGE + "/" + self.filename)
-                self.preprocess_text()
+                backend = extraction_backends.get_backend()
+                # the pages are normalised as the backend extracts them, the raw text is never held in full
+                pages = backend.iter_pages(source or globals.TEMP_DOC_STORAGE + "/" + self.filename)
+                self.text = default_normaliser.normalise_stream(pages)
             except Exception as e:
                 logger.info("text extraction failed!")
         if len(self.text) < 10:
@@ -38,6 +57,11 @@ class Document:
             self.doc_type = globals.OTHER
 
     def classify_doc(self):
+        # one scan of the header window for all title markers, see src.classifier
+        self.doc_type = classifier.classify(self.filename, self.text, self.doc_type, globals.CLASSIFIER_HEADER_CHARS)
+
+    def apply_classification_rules(self):
+        # the rule by rule reference of classifier.classify, every rule scans the whole text
         self.is_legal_doc()
         self.is_pd()
         self.is_mr()
@@ -52,20 +76,21 @@ class Document:
     def analyse_language(self):
         if self.filename.lower().endswith(".pdf"):
             try:
-                self.language = detect(self.text)
+                # seeded and cached by the hash of the text, see src.language
+                self.language, confidence = language_detection.detect_language(
+                    self.text, globals.LANGUAGE_DETECTION, globals.LANGUAGE_SAMPLES, globals.LANGUAGE_SAMPLE_CHARS,
+                    globals.LANGUAGE_SEED)
+                logging.getLogger('MyApp').info(f"language in the file: {self.filename} is {self.language} "
+                                                f"with confidence {confidence}")
             except Exception as e:
                 logging.getLogger('MyApp').info(f"language in the file: "
                                                 f"{self.filename} could not be detected due to the error: {e}")
                 self.language = "not detected"
 
     def preprocess_text(self):
-        x = self.text
-        if x:
-            x1 = re.sub(r'\n+', '\n', x)
-            x2 = re.sub(r'\S+@\S+', '[personal e-mail]', x1)
-            x3 = re.sub(r'\d{6,}', '[personal phone number]', x2)
-            x4 = re.sub(r'\.{5,}', '....', x3)
-            self.text = x4
+        if self.text:
+            # collapses newlines, masks e-mail addresses and phone numbers, shortens dot leaders, see src.normaliser
+            self.text = default_normaliser.normalise(self.text)
 
     def is_legal_doc(self):
         if self.filename.lower().endswith(".pdf"):
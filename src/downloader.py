@@ -0,0 +1,128 @@
+import logging
+import os
+import time
+import requests
+from requests.adapters import HTTPAdapter
+import globals
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class DownloadMetrics:
+
+    def __init__(self, url, path):
+        self.url = url
+        self.path = path
+        self.bytes = 0
+        self.seconds = 0.0
+        self.attempts = 0
+        self.resumed_at = 0
+
+    def __repr__(self):
+        return (f"{os.path.basename(self.path)}: {self.bytes} bytes in {self.seconds:.2f}s "
+                f"({self.attempts} attempt(s), resumed at byte {self.resumed_at})")
+
+
+class Downloader:
+    # pooled HTTP session that streams files into memory in chunks, spilling large ones to disk, retries with
+    # exponential backoff and resumes interrupted transfers on disk with a Range request
+
+    def __init__(self, max_workers=4, retries=4, backoff=1.0, timeout=(10, 120), chunk_size=1024 * 1024):
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def download_buffer(self, url, spill_path, spill_threshold, metrics=None):
+        # returns the content as bytes, or None when it is larger than spill_threshold and was written to spill_path
+        metrics = metrics or DownloadMetrics(url, spill_path)
+        content = self.retrying(url, metrics, lambda: self.fetch_buffer(url, spill_path, spill_threshold, metrics))
+        logging.getLogger('MyApp').info(f"Downloaded {metrics}{' to memory' if content is not None else ''}")
+        return content
+
+    def retrying(self, url, metrics, attempt):
+        logger = logging.getLogger('MyApp')
+        start_time = time.monotonic()
+        while True:
+            metrics.attempts += 1
+            try:
+                result = attempt()
+                metrics.seconds = time.monotonic() - start_time
+                return result
+            except requests.RequestException as e:
+                status = e.response.status_code if e.response is not None else None
+                if metrics.attempts > self.retries or (status is not None and status not in RETRY_STATUS_CODES):
+                    logger.info(f"Downloading {url} failed after {metrics.attempts} attempt(s): {e}")
+                    raise
+                delay = self.backoff * 2 ** (metrics.attempts - 1)
+                logger.info(f"Download attempt {metrics.attempts} of {url} failed ({e}), retrying in {delay}s")
+                time.sleep(delay)
+
+    def fetch(self, url, partial_path, metrics):
+        existing = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        headers = {'Range': f'bytes={existing}-'} if existing else {}
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 416:
+                # the partial file does not fit the resource any more, start over
+                os.remove(partial_path)
+                raise requests.HTTPError("requested range not satisfiable, restarting download", response=None)
+            response.raise_for_status()
+            resumed = existing and response.status_code == 206 and \
+                response.headers.get('Content-Range', '').startswith(f'bytes {existing}-')
+            if resumed:
+                metrics.resumed_at = existing
+            with open(partial_path, 'ab' if resumed else 'wb') as file:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    file.write(chunk)
+                    metrics.bytes += len(chunk)
+
+    def fetch_buffer(self, url, spill_path, spill_threshold, metrics):
+        partial_path = spill_path + '.part'
+        if os.path.exists(partial_path):
+            # an earlier attempt had already spilled to disk, resume it there
+            self.fetch(url, partial_path, metrics)
+            os.replace(partial_path, spill_path)
+            return None
+        buffer = bytearray()
+        file = None
+        try:
+            with self.session.get(url, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                if int(response.headers.get('Content-Length') or 0) > spill_threshold:
+                    file = open(partial_path, 'wb')
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    metrics.bytes += len(chunk)
+                    if file is None and len(buffer) + len(chunk) > spill_threshold:
+                        # larger than announced, or no Content-Length at all
+                        file = open(partial_path, 'wb')
+                        file.write(buffer)
+                        buffer = None
+                    if file is None:
+                        buffer += chunk
+                    else:
+                        file.write(chunk)
+        finally:
+            if file is not None:
+                file.close()
+        if file is None:
+            return bytes(buffer)
+        os.replace(partial_path, spill_path)
+        return None
+
+    def close(self):
+        self.session.close()
+
+
+downloader = None
+
+
+def get_downloader():
+    global downloader
+    if downloader is None:
+        downloader = Downloader(globals.DOWNLOAD_CONCURRENCY)
+    return downloader
@@ -0,0 +1,140 @@
+import io
+import logging
+import os
+from contextlib import contextmanager
+from pdfminer.converter import TextConverter
+from pdfminer.high_level import extract_text
+from pdfminer.layout import LAParams
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+import globals
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf
+    except ImportError:
+        pymupdf = None
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+
+@contextmanager
+def open_source(source):
+    # source is the PDF content as bytes or the path of the PDF file
+    if isinstance(source, (bytes, bytearray)):
+        yield io.BytesIO(source)
+    else:
+        with open(source, 'rb') as file:
+            yield file
+
+
+def page_texts(pages, resource_manager, laparams):
+    output = io.StringIO()
+    converter = TextConverter(resource_manager, output, laparams=laparams)
+    try:
+        interpreter = PDFPageInterpreter(resource_manager, converter)
+        for page in pages:
+            interpreter.process_page(page)
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    finally:
+        converter.close()
+
+
+# every backend has extract(source), which returns the whole text, and iter_pages(source), which yields the text of each
+# page followed by a form feed like pdfminer does
+class PdfminerBackend:
+    # the reference backend, stored texts and the classification rules are based on its output
+    name = 'pdfminer'
+
+    def extract(self, source):
+        with open_source(source) as file:
+            return extract_text(file)
+
+    def iter_pages(self, source):
+        with open_source(source) as file:
+            document = PDFDocument(PDFParser(file))
+            yield from page_texts(PDFPage.create_pages(document), PDFResourceManager(), LAParams())
+
+
+class PypdfBackend:
+    name = 'pypdf'
+
+    def extract(self, source):
+        return ''.join(self.iter_pages(source))
+
+    def iter_pages(self, source):
+        with open_source(source) as file:
+            for page in pypdf.PdfReader(file).pages:
+                yield (page.extract_text() or '') + '\f'
+
+
+class PymupdfBackend:
+    name = 'pymupdf'
+
+    def extract(self, source):
+        return ''.join(self.iter_pages(source))
+
+    def iter_pages(self, source):
+        if isinstance(source, (bytes, bytearray)):
+            document = pymupdf.open(stream=bytes(source), filetype='pdf')
+        else:
+            document = pymupdf.open(source)
+        with document:
+            for page in document:
+                yield page.get_text() + '\f'
+
+
+class PdfiumBackend:
+    name = 'pdfium'
+
+    def extract(self, source):
+        return ''.join(self.iter_pages(source))
+
+    def iter_pages(self, source):
+        document = pypdfium2.PdfDocument(bytes(source) if isinstance(source, bytearray) else source)
+        try:
+            for page in document:
+                yield page.get_textpage().get_text_range() + '\f'
+        finally:
+            document.close()
+
+
+# backend name -> (backend class, True if its library is installed)
+BACKENDS = {
+    PdfminerBackend.name: (PdfminerBackend, True),
+    PypdfBackend.name: (PypdfBackend, pypdf is not None),
+    PymupdfBackend.name: (PymupdfBackend, pymupdf is not None),
+    PdfiumBackend.name: (PdfiumBackend, pypdfium2 is not None),
+}
+
+backends = {}
+
+
+def available_backends():
+    return [name for name, (_, installed) in BACKENDS.items() if installed]
+
+
+def get_backend(name=None):
+    # PDF_BACKEND selects the backend of a run, spawned extraction processes inherit it with the environment
+    name = name or os.environ.get("PDF_BACKEND") or globals.PDF_EXTRACTION_BACKEND
+    if name not in backends:
+        backend_class, installed = BACKENDS.get(name, (None, False))
+        if not installed:
+            logging.getLogger('MyApp').info(f"PDF extraction backend {name} is not available, using pdfminer")
+            backend_class = PdfminerBackend
+        backends[name] = backend_class()
+    return backends[name]
@@ -0,0 +1,54 @@
+import fcntl
+import json
+import logging
+import os
+from contextlib import contextmanager
+
+
+@contextmanager
+def file_lock(path, exclusive=True):
+    # advisory lock shared by all processes (and threads) working on the same data directory
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class Journal:
+    # append-only JSON lines log. Callers hold the file_lock that guards the journal and the store it belongs to.
+
+    def __init__(self, path):
+        self.path = path
+
+    def append(self, records):
+        with open(self.path, 'ab+') as file:
+            # a writer that crashed mid-record leaves a torn last line, start on a fresh one
+            file.seek(0, os.SEEK_END)
+            if file.tell() > 0:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b'\n':
+                    file.write(b'\n')
+            for record in records:
+                file.write(json.dumps(record).encode('utf-8') + b'\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+    def replay(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, mode='r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logging.getLogger('MyApp').info(f'Skipping torn record in journal {self.path}')
+
+    def size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def truncate(self):
+        with open(self.path, 'wb') as file:
+            file.flush()
+            os.fsync(file.fileno())
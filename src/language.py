@@ -0,0 +1,96 @@
+import hashlib
+import logging
+import random
+import sqlite3
+from collections import defaultdict
+from langdetect.detector_factory import init_factory
+from langdetect.lang_detect_exception import LangDetectException
+import langdetect.detector_factory as detector_factory
+
+LANGUAGE_CACHE_DB = 'data/language_cache.db'
+NOT_DETECTED = "not detected"
+
+
+def connect_language_cache():
+    connection = sqlite3.connect(LANGUAGE_CACHE_DB, timeout=60)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS language_cache ("
+        "cache_key TEXT PRIMARY KEY, "
+        "language TEXT NOT NULL, "
+        "confidence REAL NOT NULL)"
+    )
+    return connection
+
+
+def cache_key(text, mode, samples, window, seed):
+    # the detection settings are part of the key, changing them never returns results of the old settings
+    digest = hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+    return f"{digest}:{mode}:{samples}:{window}:{seed}"
+
+
+def language_probabilities(text, seed):
+    # langdetect draws random trials, a detector with a fixed seed gives the same result on every run
+    init_factory()
+    detector = detector_factory._factory.create()
+    detector.seed = seed
+    detector.append(text)
+    return [(probability.lang, probability.prob) for probability in detector.get_probabilities()]
+
+
+def sample_windows(text, samples, window, seed):
+    # one window per equal slice of the text, at a seeded offset within the slice and moved to the next whitespace,
+    # so the samples cover the whole document and not only its cover pages
+    if len(text) <= samples * window:
+        return [text]
+    rng = random.Random(seed)
+    stride = len(text) // samples
+    windows = []
+    for index in range(samples):
+        start = index * stride + rng.randrange(max(1, stride - window))
+        space = text.find(' ', start, start + window // 4)
+        start = space + 1 if space != -1 else start
+        windows.append(text[start:start + window])
+    return windows
+
+
+def vote(windows, seed):
+    # every window votes with the probabilities of its languages, the confidence is the share of the votes the winner
+    # got, windows without letters do not vote
+    votes = defaultdict(float)
+    voters = 0
+    for window in windows:
+        try:
+            probabilities = language_probabilities(window, seed)
+        except LangDetectException:
+            continue
+        voters += 1
+        for language, probability in probabilities:
+            votes[language] += probability
+    if not voters:
+        return NOT_DETECTED, 0.0
+    # ties go to the alphabetically first language, the result never depends on dictionary order
+    language = min(votes, key=lambda name: (-votes[name], name))
+    return language, round(votes[language] / voters, 4)
+
+
+def detect_language(text, mode="sampled", samples=5, window=2000, seed=0):
+    # (language, confidence) of the text, "sampled" votes over `samples` windows of `window` characters, "full" runs
+    # langdetect on the whole text like before. Results are cached by the hash of the text
+    key = cache_key(text, mode, samples, window, seed)
+    connection = connect_language_cache()
+    try:
+        row = connection.execute("SELECT language, confidence FROM language_cache WHERE cache_key = ?",
+                                 (key,)).fetchone()
+        if row:
+            return row[0], row[1]
+        windows = sample_windows(text, samples, window, seed) if mode == "sampled" else [text]
+        language, confidence = vote(windows, seed)
+        with connection:
+            connection.execute("INSERT OR REPLACE INTO language_cache (cache_key, language, confidence) "
+                               "VALUES (?, ?, ?)", (key, language, confidence))
+        logging.getLogger('MyApp').debug(f"detected language {language} with confidence {confidence} "
+                                         f"from {len(windows)} window(s)")
+        return language, confidence
+    finally:
+        connection.close()
@@ -9,6 +9,7 @@ from sklearn import preprocessing
 import matplotlib.pyplot as plt
 from sklearn.metrics import silhouette_score
 import time
+from src.snapshot import read_projects
 
 
 def create_model_and_vectors(project_activities):
@@ -185,7 +186,7 @@ def project_cluster_matching():
 def add_project_details():
     columns_to_add = ['proponent', 'annual_emission_red', 'vcs_methodology', 'hectares',
                       'vcs_project_validator', 'registration_date', 'crediting_period_term']
-    df1 = pd.read_csv("data/projects.csv")
+    df1 = read_projects(['project_id'] + columns_to_add)
     df1.rename(columns={'project_id': 'Project_ID'}, inplace=True)
     df2 = pd.read_csv("data/project_summary.csv")
     merged_df = pd.merge(df1[['Project_ID'] + columns_to_add], df2, on='Project_ID', how='left')
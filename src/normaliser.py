@@ -0,0 +1,57 @@
+import io
+import re
+
+# (name, pattern, replacement) in priority order, the replacement is a string or a function of the match. The stream
+# is cut at spaces, tabs and form feeds, so rules must not match across them.
+DEFAULT_RULES = [
+    ('newlines', r'\n+', '\n'),
+    ('email', r'\S+@\S+', '[personal e-mail]'),
+    ('phone_number', r'\d{6,}', '[personal phone number]'),
+    ('dot_leader', r'\.{5,}', '....'),
+]
+
+
+class TextNormaliser:
+    # applies all rules in one pass: the rules are fused into one alternation, which gives the same result as running
+    # them one after the other as long as no rule's replacement creates a match for a later one
+
+    def __init__(self, rules=None, max_carry=1024 * 1024):
+        self.rules = list(rules or DEFAULT_RULES)
+        self.pattern = re.compile('|'.join(f'(?P<rule{index}>{pattern})'
+                                           for index, (_, pattern, _) in enumerate(self.rules)))
+        self.replacements = {f'rule{index}': replacement for index, (_, _, replacement) in enumerate(self.rules)}
+        # text without a single safe cut point is held back up to this length, then normalised as it is
+        self.max_carry = max_carry
+
+    def replace(self, match):
+        replacement = self.replacements[match.lastgroup]
+        return replacement(match) if callable(replacement) else replacement
+
+    def normalise(self, text):
+        return self.pattern.sub(self.replace, text)
+
+    def normalise_chunks(self, chunks):
+        # normalises text as it is produced, e.g. page by page by the extractor, the part after the last safe cut
+        # point of a chunk is carried over, so matches crossing chunk boundaries are handled like in one string
+        carry = ''
+        for chunk in chunks:
+            buffer = carry + chunk
+            cut = max(buffer.rfind(' '), buffer.rfind('\t'), buffer.rfind('\f'))
+            if cut == -1:
+                if len(buffer) < self.max_carry:
+                    carry = buffer
+                    continue
+                cut = len(buffer) - 1
+            yield self.normalise(buffer[:cut + 1])
+            carry = buffer[cut + 1:]
+        if carry:
+            yield self.normalise(carry)
+
+    def normalise_stream(self, chunks):
+        output = io.StringIO()
+        for normalised in self.normalise_chunks(chunks):
+            output.write(normalised)
+        return output.getvalue()
+
+
+default_normaliser = TextNormaliser()
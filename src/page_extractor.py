@@ -0,0 +1,163 @@
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+
+class RegistryPage:
+
+    def __init__(self):
+        # (section, filename, file_url, date_updated) for every document row of the apx-document-group tables
+        self.document_rows = []
+        # values listed under each heading of the VCS attribute block, e.g. {"Proponent": ["..."]}
+        self.attributes = {}
+
+
+class Capture:
+
+    def __init__(self, tag, classes=()):
+        self.tag = tag
+        self.classes = classes
+        self.parts = []
+        # href of an <a> capture, first <a> capture inside a <td> capture
+        self.href = None
+        self.first_link = None
+
+    @property
+    def text(self):
+        return ''.join(self.parts).strip()
+
+
+class RegistryPageHandler:
+    # receives start / end / data events from one pass of a streaming parser (the lxml parser target interface) and
+    # collects the document table rows and the attribute cells at the same time
+
+    def __init__(self):
+        self.page = RegistryPage()
+        self.stack = []
+        self.open_captures = []
+        self.group_depth = 0
+        self.section = None
+        self.rows = []
+        self.cells = []
+
+    def start(self, tag, attrib):
+        classes = (attrib.get('class') or '').split()
+        capture = None
+        if tag in ('th', 'td', 'a') or (tag == 'div' and 'card-header' in classes and self.group_depth
+                                        and self.section is None):
+            capture = Capture(tag, classes)
+        if tag == 'apx-document-group':
+            self.group_depth += 1
+            self.section = None
+        elif tag == 'tr' and self.group_depth:
+            self.rows.append([])
+        elif tag == 'td':
+            # th and td cells are kept in document order for the attribute block
+            self.cells.append(capture)
+            if self.group_depth and self.rows:
+                self.rows[-1].append(capture)
+        elif tag == 'th':
+            self.cells.append(capture)
+        elif tag == 'a':
+            capture.href = attrib.get('href')
+            for open_capture in self.open_captures:
+                if open_capture.tag == 'td' and open_capture.first_link is None:
+                    open_capture.first_link = capture
+        if capture:
+            self.open_captures.append(capture)
+        self.stack.append((tag, capture))
+
+    def end(self, tag):
+        if not any(open_tag == tag for open_tag, _ in self.stack):
+            return
+        while self.stack:
+            open_tag, capture = self.stack.pop()
+            if capture:
+                self.open_captures.remove(capture)
+                if capture.tag == 'div':
+                    self.section = capture.text
+            if open_tag == 'tr' and self.group_depth and self.rows:
+                self.add_document_row(self.rows.pop())
+            elif open_tag == 'apx-document-group':
+                self.group_depth -= 1
+            if open_tag == tag:
+                break
+
+    def data(self, text):
+        for capture in self.open_captures:
+            capture.parts.append(text)
+
+    def close(self):
+        self.page.attributes = vcs_attributes(self.cells)
+        return self.page
+
+    def add_document_row(self, cells):
+        # rows with a single cell are headers, not documents
+        if len(cells) > 1 and cells[0].first_link is not None:
+            link = cells[0].first_link
+            self.page.document_rows.append((self.section, link.text, link.href, cells[1].text))
+
+
+def vcs_attributes(cells):
+    data = {}
+    # Flags to ensure we are only considering values after the VCS heading, not CCB
+    vcs_started = False
+    ccb_started = False
+    current_key = None
+    for cell in cells:
+        text = cell.text
+        if cell.tag == 'th' and 'attr-sub-hdg' in cell.classes:
+            if text == 'VCS':
+                vcs_started = True
+                ccb_started = False
+            elif text == 'CCB':
+                ccb_started = True
+                vcs_started = False
+            current_key = None
+            continue
+        if vcs_started and not ccb_started and cell.tag == 'th':
+            current_key = text
+            data[current_key] = []
+        elif current_key and cell.tag == 'td':
+            data[current_key].append(text)
+    return data
+
+
+class StreamingTokenizer(HTMLParser):
+    # feeds the events of the standard library tokenizer into a RegistryPageHandler when lxml is not installed
+
+    def __init__(self, handler):
+        super().__init__(convert_charrefs=True)
+        self.handler = handler
+
+    def handle_starttag(self, tag, attrs):
+        self.handler.start(tag, {name: value or '' for name, value in attrs})
+        if tag in VOID_ELEMENTS:
+            self.handler.end(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handler.start(tag, {name: value or '' for name, value in attrs})
+        self.handler.end(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in VOID_ELEMENTS:
+            self.handler.end(tag)
+
+    def handle_data(self, data):
+        self.handler.data(data)
+
+
+def extract_page(content, parser=None):
+    parser = parser or ('lxml' if etree else 'tokenizer')
+    handler = RegistryPageHandler()
+    if parser == 'lxml':
+        return etree.fromstring(content, etree.HTMLParser(target=handler))
+    tokenizer = StreamingTokenizer(handler)
+    tokenizer.feed(content)
+    tokenizer.close()
+    return handler.close()
@@ -0,0 +1,232 @@
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from src.document import Document
+import src.database as database
+import src.downloader as downloader
+import globals
+
+DONE = object()
+
+
+def analyse_file(document, source):
+    # runs in an extraction process: pdfminer text extraction, classification and language detection of the
+    # downloaded bytes, or of the spilled file for documents above the spill threshold
+    try:
+        document.analyse_doc(source)
+    finally:
+        remove_source(source)
+    return document
+
+
+def configure_worker_logging():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(module)s - %(message)s')
+
+
+def remove_source(source):
+    if isinstance(source, str) and os.path.exists(source):
+        os.remove(source)
+
+
+class ProjectSync:
+    # the documents of one project in the shared pipeline, done once every job was stored or failed
+
+    def __init__(self, project_id, jobs):
+        self.project_id = project_id
+        self.remaining = jobs
+        self.documents = []
+        self.failures = []
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        if jobs == 0:
+            self.done.set()
+
+    def finish(self, document=None, failed=None):
+        with self.lock:
+            if document is not None:
+                self.documents.append(document)
+            if failed is not None:
+                self.failures.append(failed)
+            self.remaining -= 1
+            if self.remaining == 0:
+                self.done.set()
+
+    def wait(self):
+        # the stored documents and whether every job made it through
+        self.done.wait()
+        return self.documents, not self.failures
+
+
+class DocumentPipeline:
+    # download -> extract and classify -> store, with every stage running at the same time for the documents of all
+    # projects fed into it: downloads run on the download threads, extraction in a process pool with one process per
+    # core, storage on one thread in batches. The bounded queues between the stages stop downloads when extraction
+    # falls behind, and at most twice as many documents as there are extraction processes are extracted or waiting
+    # for storage at a time. The stages are started with the first project and run until close().
+
+    def __init__(self, extract_workers=None, queue_size=8, batch_size=16, spill_threshold=32 * 1024 * 1024):
+        self.extract_workers = extract_workers or os.cpu_count() or 1
+        self.spill_threshold = spill_threshold
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.pool = None
+        self.jobs = queue.Queue()
+        self.downloaded = queue.Queue(maxsize=queue_size)
+        self.analysed = queue.Queue()
+        self.in_flight_limit = self.extract_workers * 2
+        self.in_flight = threading.Semaphore(self.in_flight_limit)
+        self.download_threads = []
+        self.stage_threads = []
+        self.start_lock = threading.Lock()
+
+    def get_pool(self):
+        if self.pool is None:
+            # spawned workers do not inherit the locks of the browser and download threads of this process
+            self.pool = ProcessPoolExecutor(max_workers=self.extract_workers,
+                                            mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=configure_worker_logging)
+        return self.pool
+
+    @staticmethod
+    def temp_path(project_id, doc_id, filename):
+        # only documents above the spill threshold are written here, named after the document, not the registry
+        # filename, so concurrent downloads never share a file. A later run resumes or overwrites what a crashed one
+        # left behind
+        extension = os.path.splitext(filename)[1]
+        return os.path.join(globals.TEMP_DOC_STORAGE, f"{project_id}_{doc_id}{extension}")
+
+    def start(self):
+        with self.start_lock:
+            if self.stage_threads:
+                return
+            self.download_threads = [threading.Thread(target=self.download_stage, daemon=True)
+                                     for _ in range(downloader.get_downloader().max_workers)]
+            self.stage_threads = [threading.Thread(target=self.extract_stage, daemon=True),
+                                  threading.Thread(target=self.store_stage, daemon=True)]
+            for thread in self.download_threads + self.stage_threads:
+                thread.start()
+
+    def submit(self, project_id, downloads):
+        # downloads are (doc_id, filename, file_url, section, date_updated) jobs, the returned ProjectSync tells when
+        # all of them went through
+        sync = ProjectSync(project_id, len(downloads))
+        if downloads:
+            self.start()
+            for job in downloads:
+                self.jobs.put((sync, job))
+        return sync
+
+    def process(self, project_id, downloads):
+        # blocks until the project's documents are stored, the pipeline keeps working on the other projects meanwhile
+        return self.submit(project_id, downloads).wait()
+
+    def download_stage(self):
+        logger = logging.getLogger('MyApp')
+        files = downloader.get_downloader()
+        while True:
+            item = self.jobs.get()
+            if item is DONE:
+                return
+            sync, (doc_id, filename, file_url, section, date_updated) = item
+            path = self.temp_path(sync.project_id, doc_id, filename)
+            try:
+                content = files.download_buffer(file_url, path, self.spill_threshold)
+            except Exception as e:
+                logger.info(f"Downloading file {filename} failed due to the following error: {e}")
+                sync.finish(failed=filename)
+                continue
+            # blocks while the extraction queue is full
+            document = Document(doc_id, sync.project_id, filename, section, date_updated, file_url)
+            self.downloaded.put((sync, document, path if content is None else content))
+
+    def extract_stage(self):
+        logger = logging.getLogger('MyApp')
+        while True:
+            item = self.downloaded.get()
+            if item is DONE:
+                break
+            sync, document, source = item
+            # released by the store stage, or here when the extraction fails
+            self.in_flight.acquire()
+            try:
+                future = self.get_pool().submit(analyse_file, document, source)
+            except Exception as e:
+                # keep draining the download queue so the download threads never block on a dead pool
+                logger.info(f"Analysing file {document.filename} failed due to the following error: {e}")
+                self.extraction_failed(sync, document, source)
+                continue
+            future.add_done_callback(lambda done, item=item: self.forward(done, item))
+        # every document still in flight is stored once all permits are back
+        for _ in range(self.in_flight_limit):
+            self.in_flight.acquire()
+        self.analysed.put(DONE)
+
+    def forward(self, future, item):
+        sync, document, source = item
+        try:
+            self.analysed.put((sync, future.result()))
+        except Exception as e:
+            logging.getLogger('MyApp').info(f"Analysing file {document.filename} failed due to the following "
+                                            f"error: {e}")
+            self.extraction_failed(sync, document, source)
+
+    def extraction_failed(self, sync, document, source):
+        remove_source(source)
+        self.in_flight.release()
+        sync.finish(failed=document.filename)
+
+    def store_stage(self):
+        while True:
+            item = self.analysed.get()
+            if item is DONE:
+                return
+            # whatever else is waiting is stored in the same batch, the documents of several projects share a
+            # transaction
+            batch = [item]
+            while len(batch) < self.batch_size and not self.analysed.empty():
+                batch.append(self.analysed.get())
+            stored = database.store_documents([document for _, document in batch])
+            for sync, document in batch:
+                self.in_flight.release()
+                if stored:
+                    sync.finish(document=document)
+                else:
+                    # not stored, the sync of the project must not be recorded as complete
+                    sync.finish(failed=document.filename)
+
+    def close(self):
+        if self.stage_threads:
+            for _ in self.download_threads:
+                self.jobs.put(DONE)
+            for thread in self.download_threads:
+                thread.join()
+            self.downloaded.put(DONE)
+            for thread in self.stage_threads:
+                thread.join()
+            self.download_threads = []
+            self.stage_threads = []
+            self.in_flight = threading.Semaphore(self.in_flight_limit)
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+pipeline = None
+
+
+def get_pipeline():
+    global pipeline
+    if pipeline is None:
+        pipeline = DocumentPipeline(globals.EXTRACTION_WORKERS, globals.PIPELINE_QUEUE_SIZE,
+                                    globals.STORE_BATCH_SIZE, globals.DOCUMENT_SPILL_BYTES)
+    return pipeline
+
+
+def close_pipeline():
+    global pipeline
+    if pipeline is not None:
+        pipeline.close()
+        pipeline = None
@@ -1,14 +1,35 @@
-from bs4 import BeautifulSoup
-import requests
-import os
 from src.document import Document
 from typing import List
 import globals
 import logging
-from datetime import datetime
-from pyppeteer import launch
+from datetime import datetime, timedelta
 import asyncio
+import hashlib
+import re
 import src.database as database
+import src.browser_pool as browser_pool
+import src.pipeline as pipeline
+from src.rate_limit import HostRateLimiter
+from src.page_extractor import extract_page
+from src.sync_planner import plan_document_sync
+
+registry_rate_limiter = HostRateLimiter(globals.REGISTRY_MIN_REQUEST_INTERVAL)
+
+DOCUMENT_GROUP_PATTERN = re.compile(r'<apx-document-group\b.*?</apx-document-group>', re.DOTALL)
+# angular scoping attributes change with every registry deployment, not with the documents
+ANGULAR_ATTRIBUTE_PATTERN = re.compile(r'\s_ng(?:content|host)-[\w-]+(?:="[^"]*")?')
+
+SKIPPED_FRESH = "fresh"
+SKIPPED_UNCHANGED = "unchanged"
+UPDATED = "updated"
+INCOMPLETE = "incomplete"
+PLANNED = "planned"
+
+
+def documents_fingerprint(content):
+    regions = DOCUMENT_GROUP_PATTERN.findall(content)
+    normalised = ''.join(ANGULAR_ATTRIBUTE_PATTERN.sub('', region) for region in regions)
+    return hashlib.sha256(normalised.encode('utf-8')).hexdigest()
 
 
 class Project:
@@ -16,7 +37,8 @@ class Project:
     def __init__(self, project_id, website_soup=None, last_website_retrieval=None, project_activities=None,
                  baseline_scenario=None, project_activities_raw_text=None, baseline_scenario_raw_text=None,
                  proponent=None, annual_emission_red=None, vcs_methodology=None, hectares=None,
-                 vcs_project_validator=None, registration_date=None, crediting_period_term=None):
+                 vcs_project_validator=None, registration_date=None, crediting_period_term=None,
+                 documents_fingerprint=None, last_document_sync=None):
         self.project_id = project_id
         self.documents: List[Document] = []
         self.website_soup = website_soup
@@ -32,67 +54,92 @@ class Project:
         self.vcs_project_validator = vcs_project_validator
         self.registration_date = registration_date
         self.crediting_period_term = crediting_period_term
+        self.documents_fingerprint = documents_fingerprint
+        # set after every document sync that completed, the page render alone does not count
+        self.last_document_sync = last_document_sync
 
-    def scrape_and_analyse_documents(self):
+    def scrape_and_analyse_documents(self, max_age=timedelta(hours=globals.PROJECT_MAX_AGE_HOURS), dry_run=False):
         logger = logging.getLogger('MyApp')
         logger.info(f"Starting to scrape documents for project {self.project_id}.")
 
-        soup = asyncio.get_event_loop().run_until_complete(self.get_soup())
+        if self.is_fresh(max_age):
+            logger.info(f"Documents of project {self.project_id} were synced at {self.last_document_sync}, skipping.")
+            return SKIPPED_FRESH
+        content = asyncio.get_event_loop().run_until_complete(self.get_page_content(store=not dry_run))
+        return self.analyse_page(content, dry_run)
+
+    def is_fresh(self, max_age):
+        return self.last_document_sync is not None and datetime.now() - self.last_document_sync < max_age
+
+    def analyse_page(self, content, dry_run=False):
+        logger = logging.getLogger('MyApp')
+        fingerprint = documents_fingerprint(content)
+        if fingerprint == self.documents_fingerprint:
+            logger.info(f"Document table of project {self.project_id} did not change, skipping document sync.")
+            if not dry_run:
+                self.record_document_sync(fingerprint)
+            return SKIPPED_UNCHANGED
+        page = extract_page(content)
+        plan = self.plan_documents(page)
+        if dry_run:
+            return PLANNED
+        if not self.analyse_documents(page, plan):
+            # failed downloads must be retried on the next run, so the fingerprint is cleared and the sync time is
+            # not recorded
+            if self.documents_fingerprint is not None:
+                database.store_project_attribute(self.project_id, 'documents_fingerprint', None)
+                self.documents_fingerprint = None
+            return INCOMPLETE
+        self.record_document_sync(fingerprint)
+        return UPDATED
+
+    def record_document_sync(self, fingerprint):
+        self.documents_fingerprint = fingerprint
+        self.last_document_sync = datetime.now().replace(microsecond=0)
+        database.store_project_attribute(self.project_id, 'documents_fingerprint', fingerprint)
+        database.store_project_attribute(self.project_id, 'last_document_sync',
+                                         self.last_document_sync.strftime('%Y-%m-%d %H:%M:%S'))
+
+    def plan_documents(self, page):
+        logger = logging.getLogger('MyApp')
         self.documents = database.retrieve_existing_project_documents(self)
-        for group in soup.find_all('apx-document-group'):
-            section = group.find('div', {'class': 'card-header'}).text.strip()
-            logger.info(f'Iterating through website sections, current section Name: {section}.')
-            for row in group.find_all('tr'):
-                # select the correct index for the document
-                doc_id = max(doc.doc_id for doc in self.documents) + 1 if self.documents else 1
-                # find document data
-                cells = row.find_all('td')
-                if len(cells) > 1:  # (otherwise, this row is not a document)
-                    link = cells[0].find('a')
-                    file_url = link['href']
-                    filename = link.text.strip()
-                    date_updated = datetime.strptime(cells[1].text.strip(), "%d/%m/%Y")
-                    if any(file.filename == filename for file in self.documents):
-                        document = [doc for doc in self.documents if doc.filename == filename][0]
-                        if document.last_updated < date_updated:
-                            logger.info(f"File {filename} was updated, analysing again!")
-                            self.download_analyse_save_delete_file(document.doc_id, filename, file_url, section,
-                                                                   date_updated)
-                        else:
-                            logger.info(f"File {filename} already in database, skipping download")
-                    else:
-                        logger.info(f"File {filename} not in database, downloading and analysing")
-                        self.download_analyse_save_delete_file(doc_id, filename, file_url, section, date_updated)
-        self.extract_standardised_project_data(soup)
+        rows = [(section, filename, file_url, datetime.strptime(date_text, "%d/%m/%Y"))
+                for section, filename, file_url, date_text in page.document_rows]
+        plan = plan_document_sync(self.documents, rows)
+        # documents that disappeared from the page stay in the store, they are only reported
+        for document in plan.removed:
+            logger.info(f"File {document.filename} is no longer listed on the project page")
+        logger.info(f"Document sync plan for project {self.project_id}: {plan.summary()}")
+        return plan
+
+    def analyse_documents(self, page, plan):
+        logger = logging.getLogger('MyApp')
+        complete = self.download_analyse_save_delete_files(plan.downloads)
+        self.extract_standardised_project_data(page.attributes)
         logger.info("Finished downloading documents for this project, see details:")
         logger.info(self.project_details())
-
-    def download_analyse_save_delete_file(self, doc_id, filename, file_url, section, date_updated):
-        logger = logging.getLogger('MyApp')
-        logger.info(f"Downloading file {filename} from {file_url}")
-        response = requests.get(file_url)
-        with open(os.path.join(globals.TEMP_DOC_STORAGE, filename), 'wb') as file:
-            file.write(response.content)
-        document = Document(doc_id, self.project_id, filename, section, date_updated, file_url)
-        document.analyse_doc()
-        self.documents = [doc for doc in self.documents if doc.filename != filename]
-        self.documents.append(document)
-        database.store_document(document)
-        logger.info(f"Deleting file {filename}")
-        os.remove(os.path.join(globals.TEMP_DOC_STORAGE, filename))
-
-    async def get_soup(self):
+        return complete
+
+    def download_analyse_save_delete_files(self, downloads):
+        # the files are downloaded, analysed and stored by the staged pipeline, see src.pipeline
+        documents, complete = pipeline.get_pipeline().process(self.project_id, downloads)
+        documents_by_filename = {doc.filename: doc for doc in self.documents}
+        for document in documents:
+            documents_by_filename[document.filename] = document
+        self.documents = list(documents_by_filename.values())
+        return complete
+
+    async def get_page_content(self, store=True):
         logging.getLogger('MyApp').info(f"Getting soup for project {self.project_id} with managed browser.")
         url = globals.PROJECT_URL_BASE + str(self.project_id)
-        browser = await launch()
-        page = await browser.newPage()
-        await page.goto(url)
-        await page.waitForSelector('apx-document-group')
-        content = await page.content()
-        database.store_website_content(self, content)
-        soup = BeautifulSoup(content, 'html.parser')
-        await browser.close()
-        return soup
+        async with browser_pool.get_pool().page() as page:
+            await registry_rate_limiter.wait(url)
+            await page.goto(url)
+            await page.waitForSelector('apx-document-group')
+            content = await page.content()
+        if store:
+            database.store_website_content(self, content)
+        return content
 
     def project_details(self):
         general_info = (
@@ -124,18 +171,13 @@ class Project:
             "vcs_project_validator": self.vcs_project_validator,
             "registration_date": self.registration_date.strftime('%Y-%m-%d') if
             self.registration_date else None,
-            "crediting_period_term": self.crediting_period_term
+            "crediting_period_term": self.crediting_period_term,
+            "documents_fingerprint": self.documents_fingerprint
         }
 
-    def extract_standardised_project_data(self, soup: BeautifulSoup):
+    def extract_standardised_project_data(self, data):
         logger = logging.getLogger('MyApp')
-        # This is where we'll store the extracted data
-        data = {}
-
-        # Flags to ensure we are only considering values after the VCS heading, not CCB
-        vcs_started = False
-        ccb_started = False
-
+        # data holds the values listed under each heading of the VCS attribute block, see src.page_extractor
         mapping = {
             "Proponent": "proponent",
             "Estimated Annual Emission Reductions": "annual_emission_red",
@@ -146,26 +188,6 @@ class Project:
             "Crediting Period Term": "crediting_period_term"
         }
 
-        current_key = None
-        for th in soup.find_all(['th', 'td']):
-            text = th.text.strip()
-
-            if th.name == 'th' and 'attr-sub-hdg' in th.get('class', []):
-                if text == 'VCS':
-                    vcs_started = True
-                    ccb_started = False
-                elif text == 'CCB':
-                    ccb_started = True
-                    vcs_started = False
-                current_key = None
-                continue
-
-            if vcs_started and not ccb_started and th.name == 'th':
-                current_key = text
-                data[current_key] = []
-            elif current_key and th.name == 'td':
-                data[current_key].append(text)
-
         logger.info("extracted the following structured data for project with id " + str(self.project_id))
         for key, values in data.items():
             if key in mapping:
@@ -0,0 +1,21 @@
+import asyncio
+import time
+from urllib.parse import urlparse
+
+
+class HostRateLimiter:
+    # spaces out requests to the same host by at least min_interval seconds, requests to other hosts are not delayed
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self.locks = {}
+        self.last_request = {}
+
+    async def wait(self, url):
+        host = urlparse(url).netloc
+        lock = self.locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            delay = self.last_request.get(host, 0) + self.min_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.last_request[host] = time.monotonic()
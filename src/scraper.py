@@ -1,49 +1,127 @@
 import asyncio
+import hashlib
 import os
+import pickle
 import time
 import shutil
 import pandas as pd
+import requests
 from pyppeteer import launch
 import globals
 import logging
 import src.database as database
 
+# the only columns of the registry export the pipeline uses
+PROJECT_LIST_COLUMNS = ['ID', 'AFOLU Activities', 'Status']
+
 
 def download_and_update_project_list(retries=3):
     logger = logging.getLogger('MyApp')
     if file_download_required('allprojects.xlsx'):
         for i in range(retries):
-            logger.info(f'Trial number {i} to retrieve the project list starting.')
+            logger.info(f'Trial number {i} to retrieve the project list over HTTP starting.')
             try:
-                asyncio.get_event_loop().run_until_complete(access_list('allprojects'))
+                fetch_project_list()
+                break
             except Exception as e:
                 logger.info(f"Trial #{i}: that didn't work due to the following error: {e}")
-                continue
-            filename = recently_created_file_exists("allprojects")
-            if filename != "False":
-                check_and_move_or_replace(filename, 'allprojects.xlsx')
-                break
+        else:
+            # the registry export endpoint is not reachable or changed, fall back to clicking through the website
+            download_project_list_with_browser(retries)
     project_ids = find_redd_ids()
     database.update_project_list(project_ids)
 
 
+def fetch_project_list(url=globals.PROJECT_LIST_EXPORT_URL, query=globals.PROJECT_LIST_EXPORT_QUERY,
+                       destination=None, timeout=(10, 120)):
+    logger = logging.getLogger('MyApp')
+    destination = destination or os.path.join(os.getcwd(), 'files', 'allprojects.xlsx')
+    partial_path = destination + '.part'
+    start_time = time.time()
+    with requests.post(url, json=query, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        with open(partial_path, 'wb') as file:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                file.write(chunk)
+    # an error page served with status 200 must not replace the last good list
+    with open(partial_path, 'rb') as file:
+        is_workbook = file.read(4) == b'PK\x03\x04'
+    if not is_workbook:
+        os.remove(partial_path)
+        raise ValueError(f'{url} did not return an Excel workbook.')
+    os.replace(partial_path, destination)
+    logger.info(f'Project list downloaded over HTTP in {time.time() - start_time} seconds.')
+
+
+def download_project_list_with_browser(retries=3, url=globals.URL):
+    logger = logging.getLogger('MyApp')
+    for i in range(retries):
+        logger.info(f'Trial number {i} to retrieve the project list with the managed browser starting.')
+        try:
+            asyncio.get_event_loop().run_until_complete(access_list('allprojects', url))
+        except Exception as e:
+            logger.info(f"Trial #{i}: that didn't work due to the following error: {e}")
+            continue
+        filename = recently_created_file_exists("allprojects")
+        if filename:
+            check_and_move_or_replace(filename, 'allprojects.xlsx')
+            break
+
+
 def find_redd_ids():
     logger = logging.getLogger('MyApp')
     logger.info('Finding REDD AFOLU project IDs.')
     file_path = os.path.join(os.getcwd(), 'files', 'allprojects.xlsx')
-    df = pd.read_excel(file_path)
+    df = read_project_list(file_path)
     filtered_df = df[(df['AFOLU Activities'] == 'REDD') & (df['Status'] == 'Registered')]
     project_ids = filtered_df['ID'].values
     logger.info('There are ' + str(len(project_ids)) + ' registered REDD AFOLU projects.')
     return project_ids
 
 
-async def access_list(target):
+def read_project_list(file_path):
+    # parsing the workbook is slow, the parsed columns are pickled next to it and reused while the workbook is
+    # unchanged: same mtime and size, or, after a re-download, the same content hash
+    logger = logging.getLogger('MyApp')
+    cache_path = os.path.splitext(file_path)[0] + '.cache.pkl'
+    stat = os.stat(file_path)
+    cache = None
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as file:
+                cache = pickle.load(file)
+        except Exception as e:
+            logger.info(f'Ignoring unreadable project list cache {cache_path}: {e}')
+    if cache and cache['mtime'] == stat.st_mtime_ns and cache['size'] == stat.st_size:
+        return cache['table']
+    sha256 = file_sha256(file_path)
+    if cache and cache['sha256'] == sha256:
+        table = cache['table']
+    else:
+        logger.info(f'Parsing {file_path}.')
+        table = pd.read_excel(file_path, usecols=PROJECT_LIST_COLUMNS)
+    temp_path = cache_path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        pickle.dump({'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': sha256, 'table': table}, file,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, cache_path)
+    return table
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def access_list(target, url=globals.URL):
     logger = logging.getLogger('MyApp')
     logger.info('Launching managed browser to retrieve project list.')
     browser = await launch(headless=False)
     page = await browser.newPage()
-    await page.goto(globals.URL)
+    await page.goto(url)
     await page.waitForXPath('//button[@type="submit"]')
     buttons = await page.xpath('//button[@type="submit"]')
     await buttons[0].click()
@@ -0,0 +1,157 @@
+import logging
+import re
+import sqlite3
+
+SEARCH_DB = 'data/search.db'
+# FTS5 rows are keyed by a single integer, documents are addressed as project_id * DOC_ID_RANGE + doc_id
+DOC_ID_RANGE = 1000000
+
+# the FTS5 table is contentless, it only holds the index and no second, uncompressed copy of the texts. The texts stay
+# in the compressed text store, indexed_blobs records the blob each row was indexed from: a row can only be removed
+# from a contentless table by passing the exact text it was indexed with, and snippets are cut from that text
+WORD_PATTERN = re.compile(r'\w+')
+QUERY_TERM_PATTERN = re.compile(r'(\w+)(\*)?')
+QUERY_OPERATORS = {'AND', 'OR', 'NOT', 'NEAR'}
+# snippets look for the first hit in this many leading bytes of a text, only that part is decompressed
+SNIPPET_SCAN_BYTES = 256 * 1024
+
+
+def connect_search_db():
+    connection = sqlite3.connect(SEARCH_DB, timeout=60)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS document_search USING fts5(text, content='', tokenize = 'unicode61')"
+    )
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS indexed_blobs ("
+        "rowid INTEGER PRIMARY KEY, "
+        "blob_offset INTEGER NOT NULL, "
+        "blob_size INTEGER NOT NULL, "
+        "codec TEXT NOT NULL)"
+    )
+    return connection
+
+
+def search_key(project_id, doc_id):
+    return int(project_id) * DOC_ID_RANGE + int(doc_id)
+
+
+def index_document(connection, project_id, doc_id, text, blob):
+    # blob is the (offset, size, codec) of the text in the text store
+    from src.database import text_store
+    key = search_key(project_id, doc_id)
+    indexed = connection.execute("SELECT blob_offset, blob_size, codec FROM indexed_blobs WHERE rowid = ?",
+                                 (key,)).fetchone()
+    if indexed:
+        connection.execute("INSERT INTO document_search (document_search, rowid, text) VALUES ('delete', ?, ?)",
+                           (key, text_store.read(*indexed)))
+    connection.execute("INSERT INTO document_search (rowid, text) VALUES (?, ?)", (key, text))
+    connection.execute("INSERT OR REPLACE INTO indexed_blobs (rowid, blob_offset, blob_size, codec) "
+                       "VALUES (?, ?, ?, ?)", (key, *blob))
+
+
+def store_search_texts(entries):
+    # (project_id, doc_id, text, blob) entries, indexed in one transaction
+    connection = connect_search_db()
+    with connection:
+        for project_id, doc_id, text, blob in entries:
+            index_document(connection, project_id, doc_id, text, blob)
+    connection.close()
+
+
+def search_documents(query, limit=20, snippet_tokens=16, snippets=False):
+    # query uses the FTS5 syntax: "VCS Version 4" AND VM0007, "avoided deforestation" NOT draft, NEAR(a b, 10), ...
+    # returns (project_id, doc_id, snippet) ranked by bm25, the snippet is None unless snippets are asked for, they
+    # need the texts from the text store
+    from src.database import text_store
+    connection = connect_search_db()
+    rows = connection.execute(
+        "SELECT s.rowid, b.blob_offset, b.blob_size, b.codec FROM document_search s "
+        "JOIN indexed_blobs b ON b.rowid = s.rowid WHERE document_search MATCH ? ORDER BY s.rank LIMIT ?",
+        (query, limit)
+    ).fetchall()
+    connection.close()
+    terms = query_terms(query)
+    return [(key // DOC_ID_RANGE, key % DOC_ID_RANGE,
+             snippet(text_store.read_prefix(offset, size, codec, SNIPPET_SCAN_BYTES), terms, snippet_tokens)
+             if snippets else None)
+            for key, offset, size, codec in rows]
+
+
+def query_terms(query):
+    # the lowercased words of the query without its operators as (word, is prefix), carb* matches any word starting
+    # with carb
+    return [(match.group(1).lower(), bool(match.group(2))) for match in QUERY_TERM_PATTERN.finditer(query)
+            if match.group(1) not in QUERY_OPERATORS]
+
+
+def terms_pattern(terms):
+    return re.compile(r'\b(?:' + '|'.join(re.escape(term) + (r'\w*' if prefix else '') for term, prefix in terms) +
+                      r')\b', re.IGNORECASE)
+
+
+def is_word_character(character):
+    return character.isalnum() or character == '_'
+
+
+def first_hit(text, terms):
+    # position of the first query word in the text, found with str.find on the lowercased text, which is much faster
+    # than a case-insensitive regex over a long text
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # a few characters lowercase to more than one, positions in both texts no longer line up
+        match = terms_pattern(terms).search(text)
+        return match.start() if match else None
+    first = None
+    for term, prefix in terms:
+        position = lowered.find(term)
+        while position != -1 and (first is None or position < first):
+            end = position + len(term)
+            if (position == 0 or not is_word_character(lowered[position - 1])) and \
+                    (prefix or end == len(lowered) or not is_word_character(lowered[end])):
+                first = position
+                break
+            position = lowered.find(term, position + 1)
+    return first
+
+
+def snippet(text, terms, snippet_tokens):
+    # like the FTS5 snippet function: `snippet_tokens` words around the first hit, hits in [], cuts marked with ...
+    # Without a hit in the scanned part the snippet is taken from the start of the text
+    start = (first_hit(text, terms) if terms else None) or 0
+    # words are at most a few dozen characters, the context around the hit is enough to find the surrounding ones
+    context_start = max(0, start - 40 * snippet_tokens)
+    words = [word.span() for word in WORD_PATTERN.finditer(text, context_start, start + 40 * snippet_tokens)]
+    if not words:
+        return ''
+    first = next((index for index, (word_start, _) in enumerate(words) if word_start >= start), 0)
+    begin = max(0, min(first - snippet_tokens // 4, len(words) - snippet_tokens))
+    end = min(len(words), begin + snippet_tokens)
+    cut = text[words[begin][0]:words[end - 1][1]]
+    if terms:
+        cut = terms_pattern(terms).sub(lambda hit: f'[{hit.group()}]', cut)
+    prefix = '...' if WORD_PATTERN.search(text, 0, words[begin][0]) else ''
+    suffix = '...' if WORD_PATTERN.search(text, words[end - 1][1]) else ''
+    return prefix + cut + suffix
+
+
+def rebuild_search_index():
+    import src.database as database
+    logger = logging.getLogger('MyApp')
+    logger.info('Rebuilding the full-text search index from the document store')
+
+    documents = database.connect_documents_db()
+    connection = connect_search_db()
+    indexed = 0
+    with connection:
+        connection.execute("INSERT INTO document_search (document_search) VALUES ('delete-all')")
+        connection.execute("DELETE FROM indexed_blobs")
+        for row in documents.execute("SELECT * FROM text_index ORDER BY project_id, doc_id"):
+            blob = (row['blob_offset'], row['blob_size'], row['codec'])
+            index_document(connection, row['project_id'], row['doc_id'], database.text_store.read(*blob), blob)
+            indexed += 1
+        connection.execute("INSERT INTO document_search (document_search) VALUES ('optimize')")
+    connection.close()
+    documents.close()
+    logger.info(f'Indexed {indexed} documents for full-text search')
+    return indexed
@@ -0,0 +1,142 @@
+import logging
+import re
+from pdfminer.layout import LAParams
+from pdfminer.pdfdocument import PDFDocument, PDFNoOutlines
+from pdfminer.pdfinterp import PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import resolve1
+from pdfminer.psparser import PSLiteral
+from src.extraction_backends import open_source, page_texts
+
+# numbered heading at the start of a line, e.g. "1.11 Project Activities" or "2 APPLICATION OF METHODOLOGY"
+HEADING_LINE_PATTERN = re.compile(r'^[ \t]*(\d{1,2}(?:\.\d{1,2}){0,3})\.?[ \t]+[A-Za-z]', re.MULTILINE)
+# table of contents lines carry dot leaders or end with the page number, pages listing this many headings are taken
+# for a table of contents even without them
+TOC_LINE_PATTERN = re.compile(r'\.{4,}|\s\d+\s*$')
+TOC_MIN_HEADINGS = 10
+
+
+def extract_section_text(source, heading, laparams=None):
+    # extracts only the pages of `heading` (e.g. "1.11") up to the page where the section after it starts, found via
+    # the outline of the PDF or, without a usable outline, by extracting page by page. None if the heading is not found
+    logger = logging.getLogger('MyApp')
+    with open_source(source) as file:
+        document = PDFDocument(PDFParser(file))
+        pages = list(PDFPage.create_pages(document))
+        resource_manager = PDFResourceManager()
+        laparams = laparams or LAParams()
+        page_range = outline_page_range(document, pages, heading)
+        if page_range:
+            start, end = page_range
+            logger.info(f"Extracting section {heading} from pages {start + 1} to {end + 1} of {len(pages)}, "
+                        f"found in the outline")
+            return ''.join(page_texts(pages[start:end + 1], resource_manager, laparams))
+        return scan_section(pages, heading, resource_manager, laparams)
+
+
+def heading_number(heading):
+    return tuple(int(part) for part in heading.split('.'))
+
+
+def outline_page_range(document, pages, heading):
+    try:
+        outlines = list(document.get_outlines())
+    except PDFNoOutlines:
+        return None
+    except Exception as e:
+        logging.getLogger('MyApp').info(f"The outline of the PDF could not be read: {e}")
+        return None
+    page_index = {page.pageid: index for index, page in enumerate(pages)}
+    entries = []
+    for level, title, destination, action, _ in outlines:
+        page = outline_page(document, destination, action, page_index)
+        match = HEADING_LINE_PATTERN.match(title or '')
+        if page is not None:
+            entries.append((level, match.group(1) if match else None, page))
+    for index, (level, number, start) in enumerate(entries):
+        if number == heading:
+            # the section ends on the page of the next entry that is not one of its subsections
+            end = next((page for next_level, next_number, page in entries[index + 1:]
+                        if next_level <= level and not (next_number or '').startswith(heading + '.')), len(pages) - 1)
+            return start, max(start, end)
+    return None
+
+
+def outline_page(document, destination, action, page_index):
+    try:
+        if destination is None and action is not None:
+            destination = resolve1(action).get('D')
+        destination = resolve1(destination)
+        if isinstance(destination, (PSLiteral, str, bytes)):
+            # named destination
+            name = destination.name if isinstance(destination, PSLiteral) else destination
+            destination = resolve1(document.get_dest(name))
+        if isinstance(destination, dict):
+            destination = resolve1(destination.get('D'))
+        if isinstance(destination, list) and destination:
+            return page_index.get(getattr(destination[0], 'objid', None))
+    except Exception:
+        pass
+    return None
+
+
+def scan_section(pages, heading, resource_manager, laparams):
+    # page by page from the start, collecting from the page that opens the section until the page where the next
+    # section at the same or a higher level begins
+    logger = logging.getLogger('MyApp')
+    following = next_headings(heading_number(heading))
+    listed = set()
+    collected = []
+    for index, text in enumerate(page_texts(pages, resource_manager, laparams)):
+        position = 0
+        if not collected:
+            position = section_start(text, heading)
+            if position is None:
+                continue
+        collected.append(text)
+        if section_end(text, position, following, listed) is not None:
+            logger.info(f"Extracted section {heading} from {len(collected)} page(s), stopped at page {index + 1} "
+                        f"of {len(pages)}")
+            return ''.join(collected)
+    if collected:
+        return ''.join(collected)
+    logger.info(f"Section {heading} not found in the PDF")
+    return None
+
+
+def section_start(text, heading):
+    if len(HEADING_LINE_PATTERN.findall(text)) >= TOC_MIN_HEADINGS:
+        return None
+    for match in HEADING_LINE_PATTERN.finditer(text):
+        if match.group(1) == heading and not TOC_LINE_PATTERN.search(line_at(text, match.start())):
+            return match.end()
+    return None
+
+
+def next_headings(target):
+    # the headings that can open the next section, e.g. 1.12, 2 or 2.1 after 1.11
+    following = set()
+    for level in range(len(target)):
+        heading = target[:level] + (target[level] + 1,)
+        for depth in range(len(target) - level):
+            following.add(heading + (1,) * depth)
+    return following
+
+
+def section_end(text, position, following, listed):
+    # listed collects the numbered lines of the section across its pages, a number that continues one of them is a
+    # list item ("2 Agroforestry" after "1 Forest patrolling") and not the next heading
+    for match in HEADING_LINE_PATTERN.finditer(text, position):
+        if TOC_LINE_PATTERN.search(line_at(text, match.start())):
+            continue
+        number = heading_number(match.group(1))
+        if number in following and number[:-1] + (number[-1] - 1,) not in listed:
+            return match.start()
+        listed.add(number)
+    return None
+
+
+def line_at(text, position):
+    end = text.find('\n', position)
+    return text[position:end if end != -1 else len(text)]
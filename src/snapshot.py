@@ -0,0 +1,169 @@
+import logging
+import os
+import sys
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import src.database as database
+
+SNAPSHOT_DIR = 'data/snapshot'
+ACTIVITIES_CSV = 'data/clustered_activities_classified.csv'
+BATCH_SIZE = 5000
+
+# parquet keeps timestamps in milliseconds at the coarsest, so the snapshot reads back what the fallback builds
+PROJECTS_SCHEMA = pa.schema([
+    ('project_id', pa.int64()),
+    ('last_website_retrieval', pa.timestamp('ms')),
+    ('project_activities', pa.string()),
+    ('baseline_scenario', pa.string()),
+    ('project_activities_raw_text', pa.string()),
+    ('baseline_scenario_raw_text', pa.string()),
+    ('proponent', pa.string()),
+    ('annual_emission_red', pa.string()),
+    ('vcs_methodology', pa.string()),
+    ('hectares', pa.string()),
+    ('vcs_project_validator', pa.string()),
+    ('registration_date', pa.timestamp('ms')),
+    ('crediting_period_term', pa.string()),
+])
+
+DOCUMENTS_SCHEMA = pa.schema([
+    ('project_id', pa.int64()),
+    ('doc_id', pa.int64()),
+    ('filename', pa.string()),
+    ('website_category', pa.string()),
+    ('last_updated', pa.timestamp('ms')),
+    ('url', pa.string()),
+    ('language', pa.string()),
+    ('doc_type', pa.int16()),
+    ('text_length', pa.int64()),
+])
+
+ACTIVITIES_SCHEMA = pa.schema([
+    ('project_id', pa.int64()),
+    ('activity_index', pa.int32()),
+    ('activity', pa.string()),
+    ('cluster', pa.int32()),
+    ('classification', pa.string()),
+])
+
+
+def snapshot_path(table):
+    return os.path.join(SNAPSHOT_DIR, f'{table}.parquet')
+
+
+def parse_timestamp(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def export_snapshot(include_text=False):
+    logger = logging.getLogger('MyApp')
+    logger.info('Exporting projects, documents and activities as parquet snapshot')
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    export_projects()
+    export_documents(include_text)
+    export_activities()
+
+
+def export_projects():
+    write_table(projects_table(), 'projects')
+
+
+def projects_table():
+    # projects.csv with the journaled updates, typed by PROJECTS_SCHEMA
+    projects = sorted(database.read_projects(), key=lambda p: int(p['project_id']))
+    columns = {field.name: [] for field in PROJECTS_SCHEMA}
+    for p in projects:
+        for name in columns:
+            value = p.get(name) or None
+            if name == 'project_id':
+                value = int(value)
+            elif pa.types.is_timestamp(PROJECTS_SCHEMA.field(name).type):
+                value = parse_timestamp(value)
+            elif value is not None:
+                value = str(value)
+            columns[name].append(value)
+    return pa.table(columns, schema=PROJECTS_SCHEMA)
+
+
+def export_documents(include_text=False):
+    schema = DOCUMENTS_SCHEMA.append(pa.field('text', pa.string())) if include_text else DOCUMENTS_SCHEMA
+    connection = database.connect_documents_db()
+    rows = connection.execute(
+        "SELECT d.*, i.text_length, i.blob_offset, i.blob_size, i.codec FROM documents d "
+        "LEFT JOIN text_index i ON i.project_id = d.project_id AND i.doc_id = d.doc_id ORDER BY d.project_id, d.doc_id"
+    )
+    # written in batches, so the text of at most BATCH_SIZE documents is held in memory
+    exported = 0
+    with pq.ParquetWriter(snapshot_path('documents'), schema, compression='zstd') as writer:
+        while True:
+            batch = rows.fetchmany(BATCH_SIZE)
+            if not batch:
+                break
+            columns = {field.name: [] for field in schema}
+            for row in batch:
+                for name in columns:
+                    if name == 'text':
+                        value = database.text_store.read(row['blob_offset'], row['blob_size'], row['codec']) \
+                            if row['blob_offset'] is not None else None
+                    elif name == 'last_updated':
+                        value = parse_timestamp(row[name])
+                    else:
+                        value = row[name]
+                    columns[name].append(value)
+            writer.write_table(pa.table(columns, schema=schema))
+            exported += len(batch)
+    connection.close()
+    logging.getLogger('MyApp').info(f'Wrote {exported} rows to {snapshot_path("documents")}')
+
+
+def export_activities():
+    if not os.path.exists(ACTIVITIES_CSV):
+        logging.getLogger('MyApp').info(f'No {ACTIVITIES_CSV} found, skipping activities snapshot')
+        return
+    df = pd.read_csv(ACTIVITIES_CSV)
+    ids = df['ID'].str.split('_', expand=True)
+    activities = pd.DataFrame({
+        'project_id': ids[0].astype('int64'),
+        'activity_index': ids[1].astype('int32'),
+        'activity': df['Activity'].astype(str),
+        'cluster': df['Cluster'].astype('int32'),
+        'classification': df['Classification'] if 'Classification' in df else None,
+    }).sort_values(['project_id', 'activity_index'])
+    write_table(pa.Table.from_pandas(activities, schema=ACTIVITIES_SCHEMA, preserve_index=False), 'activities')
+
+
+def write_table(table, name):
+    pq.write_table(table, snapshot_path(name), compression='zstd', row_group_size=BATCH_SIZE)
+    logging.getLogger('MyApp').info(f'Wrote {table.num_rows} rows to {snapshot_path(name)}')
+
+
+def read_snapshot(table, columns=None, filters=None):
+    # columns limits the columns read from disk, filters (e.g. [('project_id', '==', 2723)]) skip row groups by their
+    # statistics before any data is decoded
+    return pq.read_table(snapshot_path(table), columns=columns, filters=filters).to_pandas()
+
+
+def source_mtime(source):
+    # missing and empty sources, e.g. a compacted journal, hold nothing the snapshot could lack
+    return os.path.getmtime(source) if os.path.exists(source) and os.path.getsize(source) > 0 else 0
+
+
+def snapshot_is_current(table, *sources):
+    path = snapshot_path(table)
+    return os.path.exists(path) and os.path.getmtime(path) >= max(source_mtime(source) for source in sources)
+
+
+def read_projects(columns=None):
+    # prefer the snapshot, fall back to projects.csv and the project journal when there is none or it is older than
+    # them, typed the same way as the snapshot
+    if snapshot_is_current('projects', database.PROJECTS_CSV, database.PROJECTS_JOURNAL):
+        return read_snapshot('projects', columns)
+    table = projects_table()
+    return (table.select(columns) if columns else table).to_pandas()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(module)s - %(message)s')
+    export_snapshot(include_text='--with-text' in sys.argv)
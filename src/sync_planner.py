@@ -0,0 +1,54 @@
+import logging
+
+
+class SyncPlan:
+
+    def __init__(self):
+        # new and updated entries are (doc_id, filename, file_url, section, date_updated) download jobs
+        self.new = []
+        self.updated = []
+        self.unchanged = []
+        # stored documents that are no longer listed on the project page
+        self.removed = []
+
+    @property
+    def downloads(self):
+        return self.new + self.updated
+
+    def summary(self):
+        return (f"{len(self.new)} new, {len(self.updated)} updated, {len(self.unchanged)} unchanged, "
+                f"{len(self.removed)} removed")
+
+
+def plan_document_sync(documents, document_rows):
+    # document_rows are the (section, filename, file_url, date_updated) rows of the project page, dates parsed
+    logger = logging.getLogger('MyApp')
+    plan = SyncPlan()
+    documents_by_filename = {}
+    for document in documents:
+        documents_by_filename.setdefault(document.filename, document)
+    # select the correct index for new documents
+    next_doc_id = max(doc.doc_id for doc in documents) + 1 if documents else 1
+    # a file listed more than once is planned from its most recently updated row
+    listed = {}
+    for row in document_rows:
+        filename = row[1]
+        if filename in listed:
+            logger.info(f"File {filename} listed more than once, using the most recently updated listing")
+            if row[3] <= listed[filename][3]:
+                continue
+        listed[filename] = row
+    for section, filename, file_url, date_updated in listed.values():
+        document = documents_by_filename.get(filename)
+        if document is None:
+            logger.info(f"File {filename} not in database, downloading and analysing")
+            plan.new.append((next_doc_id, filename, file_url, section, date_updated))
+            next_doc_id += 1
+        elif document.last_updated < date_updated:
+            logger.info(f"File {filename} was updated, analysing again!")
+            plan.updated.append((document.doc_id, filename, file_url, section, date_updated))
+        else:
+            logger.info(f"File {filename} already in database, skipping download")
+            plan.unchanged.append(document)
+    plan.removed = [document for filename, document in documents_by_filename.items() if filename not in listed]
+    return plan
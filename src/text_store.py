@@ -0,0 +1,101 @@
+import fcntl
+import mmap
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+TEXT_STORE = 'data/document_texts.bin'
+
+CODEC_ZLIB = 'zlib'
+CODEC_ZSTD = 'zstd'
+
+
+def compress_text(text):
+    data = text.encode('utf-8')
+    if zstandard:
+        return CODEC_ZSTD, zstandard.ZstdCompressor(level=10).compress(data)
+    return CODEC_ZLIB, zlib.compress(data, 6)
+
+
+def decompress_text(codec, data):
+    if codec == CODEC_ZSTD:
+        if not zstandard:
+            raise RuntimeError("document text was compressed with zstd, but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    return zlib.decompress(data).decode('utf-8')
+
+
+def decompress_prefix(codec, data, max_bytes):
+    # only the first max_bytes of the text are decompressed, a character cut at the end is dropped
+    if codec == CODEC_ZSTD:
+        if not zstandard:
+            raise RuntimeError("document text was compressed with zstd, but the zstandard package is not installed")
+        reader = zstandard.ZstdDecompressor().stream_reader(data)
+        chunks = []
+        remaining = max_bytes
+        while remaining > 0:
+            chunk = reader.read(remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        prefix = b''.join(chunks)
+    else:
+        prefix = zlib.decompressobj().decompress(data, max_bytes)
+    return prefix.decode('utf-8', 'ignore')
+
+
+class TextStore:
+    # append-only file of individually compressed document texts. The (offset, size, codec) of every blob is kept
+    # in the document store index, reads go through a memory map so only the requested blob is touched.
+
+    def __init__(self, path=TEXT_STORE):
+        self.path = path
+        self.file = None
+        self.map = None
+
+    def append(self, text):
+        codec, data = compress_text(text)
+        with open(self.path, 'ab') as file:
+            # concurrent writers must not interleave between reading the end offset and writing the blob
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                offset = file.seek(0, os.SEEK_END)
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+        return offset, len(data), codec
+
+    def read(self, offset, size, codec):
+        if size == 0:
+            return ""
+        if self.map is None or offset + size > len(self.map):
+            self.remap()
+        return decompress_text(codec, self.map[offset:offset + size])
+
+    def read_prefix(self, offset, size, codec, max_bytes):
+        if size == 0:
+            return ""
+        if self.map is None or offset + size > len(self.map):
+            self.remap()
+        return decompress_prefix(codec, self.map[offset:offset + size], max_bytes)
+
+    def remap(self):
+        self.close()
+        self.file = open(self.path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+